@@ -23,25 +23,41 @@
    params: {"duration": 3}
 10. hotkey - 按下快捷键
     params: {"keys": ["ctrl", "v"], "wait_after": 0.5}
-11. type - 输入文本
-    params: {"text": "文本内容", "wait_after": 0.5}
+11. type - 输入文本（默认通过剪切板粘贴，use_keystrokes 为 true 时逐字符模拟按键）
+    params: {"text": "文本内容", "wait_after": 0.5, "use_keystrokes": false}
 12. press - 按下单个键
     params: {"key": "enter", "wait_after": 0.5}
-13. save_file - 保存文件
-    params: {"method": "button|hotkey", "button_position": [x, y], "wait_after": 1}
-14. conditional - 条件步骤（如：文件已存在时跳过）
-    params: {"condition": "skip_if_exists", "steps": [...]}
+13. save_file - 保存文件（按回车后轮询等待文件写入，最多等待 timeout 秒；
+    覆盖已有文件时以修改时间变化为准。旧版的 wait_after 参数会被当作 timeout）
+    params: {"method": "button|hotkey", "button_position": [x, y], "timeout": 5}
+14. conditional - 条件步骤（skip_if_exists：文件已存在时跳过；
+    skip_if_fresh：文件比JSON数据文件新时跳过）
+    params: {"condition": "skip_if_exists|skip_if_fresh", "steps": [...]}
+15. macro - 把若干键盘/剪切板步骤合并为一次操作，最后只等待一次
+    params: {"steps": [...], "wait_after": 0.1}
+
+说明：步骤默认逐个执行，每个步骤之后等待各自的 wait_after。只有 macro 中
+连续的键盘/剪切板步骤（2、3、6、7、8、10、11、12）会先进入队列，在下一个
+其它类型的步骤之前或宏结束时一次性执行，结尾只等待其中最大的 wait_after。
 
 示例配置请参考 config.json.example
 """
 
+import functools
+import itertools
 import json
+import logging
+import logging.handlers
 import os
+import shutil
 import sys
 import time
 import subprocess
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from typing import Callable, Iterable, Iterator, List, Dict, Optional, Set, Tuple
 
 try:
     import pyautogui
@@ -51,22 +67,143 @@ except ImportError:
     print("缺失的包: pyautogui, pyperclip")
     sys.exit(1)
 
+# 只在 Windows 上读取系统DPI，ctypes 在模块加载时导入一次
+if sys.platform == "win32":
+    try:
+        import ctypes
+        _HAS_CTYPES = True
+    except ImportError:
+        _HAS_CTYPES = False
+else:
+    _HAS_CTYPES = False
+
+# 可选依赖：安装了 ijson 时流式读取很大的JSON文件，边解析边处理
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# 超过这个大小的JSON文件才流式读取（此时项目总数未知）；较小的文件一次读入，可以显示准确进度
+STREAM_JSON_THRESHOLD = 25 * 1024 * 1024
+
+
+def _path_key(path: Path) -> str:
+    """文件缓存的键：Windows和macOS的文件系统通常不区分大小写，统一转为小写"""
+    key = os.path.normcase(str(path))
+    if sys.platform == "darwin":
+        key = key.lower()
+    return key
+
+
+class _BufferedStdoutHandler(logging.handlers.BufferingHandler):
+    """缓冲日志：攒够 capacity 条、出现错误或距上次输出超过 interval 秒时一次性写入标准输出"""
+    
+    def __init__(self, capacity: int = 64, interval: float = 1.0):
+        super().__init__(capacity)
+        self.interval = interval
+        self._last_flush = time.monotonic()
+    
+    def shouldFlush(self, record: logging.LogRecord) -> bool:
+        return (len(self.buffer) >= self.capacity
+                or record.levelno >= logging.ERROR
+                or time.monotonic() - self._last_flush >= self.interval)
+    
+    def flush(self):
+        self.acquire()
+        try:
+            if self.buffer:
+                sys.stdout.write("".join(self.format(record) + "\n" for record in self.buffer))
+                sys.stdout.flush()
+                self.buffer.clear()
+            self._last_flush = time.monotonic()
+        finally:
+            self.release()
+
+
+# 进度输出：每个步骤都直接 print 会频繁写控制台，改为缓冲后批量输出
+logger = logging.getLogger("mp3batch")
+if not logger.handlers:
+    logger.addHandler(_BufferedStdoutHandler())
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+def _flush_log():
+    """立即输出缓冲中的日志（长时间等待之前调用）"""
+    for handler in logger.handlers:
+        handler.flush()
+
+
+# 编译后的指令类型：执行步骤 / 条件成立时跳转（用于展开 conditional 步骤）
+_CALL = 0
+_JUMP_IF_TRUE = 1
+
+# 超过该长度的文本直接交给系统剪切板命令写入，不经过 pyperclip
+_NATIVE_CLIPBOARD_THRESHOLD = 256
+
+
+def _find_clipboard_command() -> Optional[Tuple[List[str], str]]:
+    """查找系统剪切板命令，返回 (命令, 输入编码)；找不到时返回 None"""
+    if sys.platform == "win32":
+        # clip.exe 根据 BOM 识别 UTF-16 输入，中文不会乱码
+        return ["clip.exe"], "utf-16"
+    if sys.platform == "darwin":
+        return ["pbcopy"], "utf-8"
+    if os.environ.get("WAYLAND_DISPLAY") and shutil.which("wl-copy"):
+        return ["wl-copy"], "utf-8"
+    if shutil.which("xclip"):
+        return ["xclip", "-selection", "clipboard"], "utf-8"
+    return None
+
+
+@functools.lru_cache(maxsize=1)
+def _get_dpi_scale() -> float:
+    """获取DPI缩放比例（进程内只查询一次）"""
+    if not _HAS_CTYPES:
+        return 1.0
+    try:
+        # 获取DPI感知
+        user32 = ctypes.windll.user32
+        # 获取系统DPI
+        dc = user32.GetDC(0)
+        dpi = user32.GetDeviceCaps(dc, 88)  # LOGPIXELSX
+        user32.ReleaseDC(0, dc)
+        # 标准DPI是96，计算缩放比例
+        return dpi / 96.0
+    except Exception:
+        return 1.0
+
+
+@functools.lru_cache(maxsize=4096)
+def _build_mp3_text(name: str, name_english: str) -> str:
+    """生成MP3文本（缓存结果，同名项目直接复用）"""
+    return f"{name}{name}{name_english},{name_english} {name_english} {name_english}。"
+
+
+# 在 macro 中可以进入队列、批量执行的键盘/剪切板步骤
+_QUEUEABLE_STEPS = {
+    "copy_to_clipboard", "copy_id_to_clipboard", "paste",
+    "select_all", "delete", "hotkey", "press", "type",
+}
+
 
 class MP3BatchGenerator:
     """批量MP3生成器"""
     
-    def __init__(self, config_path: str = "tools/config.json"):
-        """初始化生成器"""
+    def __init__(self, config_path: str = "tools/config.json", stop_event=None):
+        """初始化生成器（在子进程中运行时可以传入 multiprocessing.Event 作为停止标志）"""
         self.config = self._load_config(config_path)
         self.mp3_config = self.config.get("mp3_generation", {})
         self.base_dir = Path(__file__).parent.parent
+        # 绝对路径只解析一次，后续拼接出的目标路径都已是绝对路径
+        self._base_abs = self.base_dir.resolve()
         
         # 设置pyautogui安全设置
         pyautogui.FAILSAFE = True  # 鼠标移到屏幕角落可中断
-        pyautogui.PAUSE = 0.5  # 每次操作后暂停0.5秒
+        pyautogui.PAUSE = 0  # 不自动暂停，等待时间由各步骤的 wait_after 控制
         
         # 获取DPI缩放比例
-        self.dpi_scale = self._get_dpi_scale()
+        self.dpi_scale = _get_dpi_scale()
         
         # 获取坐标偏移量（如果有配置）
         self.coord_offset = self.mp3_config.get("coordinate_offset", [0, 0])
@@ -74,51 +211,120 @@ class MP3BatchGenerator:
         # 获取坐标缩放比例（如果有配置）
         self.coord_scale = self.mp3_config.get("coordinate_scale", 1.0)
         
-        # 停止标志
-        self.should_stop = False
+        # 是否应用DPI缩放
+        self.use_dpi_scaling = self.mp3_config.get("use_dpi_scaling", False)
+        
+        # 旧版配置中保存后的固定等待时间改为等待文件写入的最长时间
+        self._migrate_save_options(self.mp3_config)
+        
+        # 配置中的坐标都是静态的，加载时一次性完成调整
+        self._precompute_coordinates(self.mp3_config.get("steps", []))
+        
+        # 停止标志：stop() 设置后，正在等待的步骤会被立即唤醒
+        self._stop_event = stop_event if stop_event is not None else threading.Event()
+        
+        # 已存在文件缓存（路径键 -> (实际路径, 修改时间ns)）：每个目录只扫描一次，避免每个项目都调用 exists()/stat()
+        # 修改时间在第一次需要时才获取（None 表示尚未获取）
+        self._existing_files: Dict[str, Tuple[Path, Optional[int]]] = {}
+        self._scanned_dirs: Set[Path] = set()
+        
+        # 本次运行中已确认存在的目录，不再重复调用 mkdir
+        self._mkdir_cache: Set[Path] = set()
+        
+        # 最近一次读取的JSON数据文件的修改时间（ns）
+        self._json_mtime: Optional[int] = None
+        
+        # 待批量执行的键盘/剪切板操作: (op, args, wait_after, 步骤描述, 执行后的日志)
+        self._pending_ops: List[Tuple[str, tuple, float, str, Optional[str]]] = []
+        # 大于 0 时处于 macro 中，键盘/剪切板操作进入队列
+        self._batch_depth = 0
+        
+        # 已找到的目标应用程序窗口，后续项目只需重新激活
+        self._app_window = None
+        
+        # 最近一次写入剪切板的内容，相同内容不再重复写入
+        self._last_clipboard: Optional[str] = None
+        # 长文本使用的系统剪切板命令（None 表示尚未查找，空元组表示不可用）
+        self._clipboard_command: Optional[tuple] = None
+        
+        # 后台预处理：下一个项目的文本、目录等在当前项目执行期间提前准备
+        # 预处理结果由 Future 直接交给对应的项目，不按ID缓存（ID可能重复或缺失）
+        self._prefetch_future: Optional[Future] = None
+        
+        # 编译后的操作步骤（首次使用时编译）
+        self._compiled_steps: Optional[List[Tuple]] = None
         
     def _load_config(self, config_path: str) -> Dict:
         """加载配置文件"""
         config_file = Path(config_path)
         if not config_file.exists():
-            print(f"错误：配置文件 {config_path} 不存在")
-            print(f"请复制 config.json.example 为 config.json 并填入配置")
+            logger.error(f"错误：配置文件 {config_path} 不存在")
+            logger.info(f"请复制 config.json.example 为 config.json 并填入配置")
             sys.exit(1)
         
         with open(config_file, 'r', encoding='utf-8') as f:
             return json.load(f)
     
-    def _get_dpi_scale(self) -> float:
-        """获取DPI缩放比例"""
-        try:
-            import platform
-            if platform.system() == "Windows":
-                try:
-                    import ctypes
-                    # 获取DPI感知
-                    user32 = ctypes.windll.user32
-                    # 获取系统DPI
-                    dc = user32.GetDC(0)
-                    dpi = user32.GetDeviceCaps(dc, 88)  # LOGPIXELSX
-                    user32.ReleaseDC(0, dc)
-                    # 标准DPI是96，计算缩放比例
-                    scale = dpi / 96.0
-                    return scale
-                except:
-                    return 1.0
-            else:
-                return 1.0
-        except:
-            return 1.0
-    
     def stop(self):
         """停止执行"""
-        self.should_stop = True
-        print("\n收到停止信号，将在当前步骤完成后停止...")
+        self._stop_event.set()
+        logger.info("\n收到停止信号，将在当前步骤完成后停止...")
     
     def _check_stop(self) -> bool:
         """检查是否应该停止"""
-        return self.should_stop
+        return self._stop_event.is_set()
+    
+    def _scan_existing_files(self, directory: Path):
+        """扫描目录一次，把其中已存在的文件加入缓存（只读取目录项，不逐个 stat）"""
+        found = {}
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        path = directory / entry.name
+                        found[_path_key(path)] = (path, None)
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+        # 扫描完成后再标记目录，预处理线程并发扫描时不会读到不完整的结果
+        self._existing_files.update(found)
+        self._scanned_dirs.add(directory)
+    
+    def _lookup_file(self, path: Path) -> Optional[Tuple[Path, Optional[int]]]:
+        """在缓存中查找文件（未扫描过的目录会先扫描），返回 (实际路径, 修改时间ns) 或 None"""
+        if path.parent not in self._scanned_dirs:
+            self._scan_existing_files(path.parent)
+        cached = self._existing_files.get(_path_key(path))
+        if cached is not None and cached[0] != path and not path.exists():
+            # 只有大小写不同，而文件系统区分大小写：不是同一个文件
+            return None
+        return cached
+    
+    def _file_exists(self, path: Path) -> bool:
+        """通过缓存判断文件是否已存在"""
+        return self._lookup_file(path) is not None
+    
+    def _file_mtime(self, path: Path) -> Optional[int]:
+        """通过缓存获取文件修改时间（文件不存在时返回 None）"""
+        cached = self._lookup_file(path)
+        if cached is None:
+            return None
+        actual_path, mtime = cached
+        if mtime is None:
+            mtime = self._get_mtime_ns(actual_path)
+            if mtime is not None:
+                self._existing_files[_path_key(path)] = (actual_path, mtime)
+        return mtime
+    
+    def _remember_file(self, path: Path):
+        """文件保存成功后更新缓存"""
+        self._existing_files[_path_key(path)] = (path, self._get_mtime_ns(path) or time.time_ns())
+    
+    def _ensure_dir(self, directory: Path):
+        """确保目录存在（每个目录只创建一次）"""
+        if directory in self._mkdir_cache:
+            return
+        directory.mkdir(parents=True, exist_ok=True)
+        self._mkdir_cache.add(directory)
     
     def _adjust_coordinate(self, x: float, y: float) -> Tuple[int, int]:
         """调整坐标（处理DPI缩放和偏移）"""
@@ -127,8 +333,7 @@ class MP3BatchGenerator:
         y_scaled = y * self.coord_scale
         
         # 应用DPI缩放（如果需要）
-        use_dpi_scale = self.mp3_config.get("use_dpi_scaling", False)
-        if use_dpi_scale:
+        if self.use_dpi_scaling:
             x_scaled = x_scaled * self.dpi_scale
             y_scaled = y_scaled * self.dpi_scale
         
@@ -138,37 +343,101 @@ class MP3BatchGenerator:
         
         return x_final, y_final
     
-    def load_json_data(self, json_file: str) -> List[Dict]:
-        """加载JSON数据"""
+    def _migrate_save_options(self, mp3_config: Dict):
+        """把旧版的 wait_time_after_save / save_file 步骤的 wait_after 转换为 save_timeout / timeout"""
+        if "wait_time_after_save" in mp3_config:
+            if "save_timeout" in mp3_config:
+                logger.warning("警告：配置项 wait_time_after_save 已废弃，已被 save_timeout 取代，将被忽略")
+            else:
+                mp3_config["save_timeout"] = mp3_config["wait_time_after_save"]
+                logger.warning("警告：配置项 wait_time_after_save 已废弃，已作为 save_timeout 使用，请改用 save_timeout")
+        
+        def migrate_steps(steps: List[Dict]):
+            for step in steps:
+                params = step.get("params")
+                if not params:
+                    continue
+                if step.get("type") == "save_file" and "wait_after" in params:
+                    if "timeout" in params:
+                        logger.warning("警告：save_file 步骤的 wait_after 参数已废弃，已被 timeout 取代，将被忽略")
+                    else:
+                        params["timeout"] = params["wait_after"]
+                        logger.warning("警告：save_file 步骤的 wait_after 参数已废弃，已作为 timeout 使用，请改用 timeout")
+                migrate_steps(params.get("steps", []))
+        
+        migrate_steps(mp3_config.get("steps", []))
+    
+    def _precompute_coordinates(self, steps: List[Dict]):
+        """遍历步骤配置（含子步骤），把调整后的坐标写入 params"""
+        for step in steps:
+            params = step.get("params")
+            if not params:
+                continue
+            for key in ("position", "button_position"):
+                position = params.get(key)
+                if position and len(position) >= 2:
+                    params[f"_adjusted_{key}"] = self._adjust_coordinate(position[0], position[1])
+            self._precompute_coordinates(params.get("steps", []))
+    
+    def load_json_data(self, json_file: str) -> Iterable[Dict]:
+        """加载JSON数据（文件很大且安装了 ijson 时返回逐项解析的迭代器，否则返回列表）"""
         json_path = self.base_dir / "data" / json_file
         if not json_path.exists():
-            print(f"错误：JSON文件不存在: {json_path}")
+            logger.error(f"错误：JSON文件不存在: {json_path}")
             return []
         
+        # 记录数据文件的修改时间，供 skip_if_fresh 条件比较
+        stat = json_path.stat()
+        self._json_mtime = stat.st_mtime_ns
+        
+        if ijson is not None and stat.st_size > STREAM_JSON_THRESHOLD:
+            return self._iter_json_items(json_path)
+        
         try:
             with open(json_path, 'r', encoding='utf-8') as f:
                 return json.load(f)
         except Exception as e:
-            print(f"错误：读取JSON文件失败: {e}")
+            logger.error(f"错误：读取JSON文件失败: {e}")
             return []
     
+    def _iter_json_items(self, json_path: Path) -> Iterator[Dict]:
+        """使用 ijson 逐个读取JSON数组中的项目"""
+        try:
+            with open(json_path, 'rb') as f:
+                yield from ijson.items(f, 'item', use_float=True)
+        except Exception as e:
+            logger.error(f"错误：读取JSON文件失败: {e}")
+    
     def find_app_window(self) -> bool:
         """查找并激活目标应用程序窗口"""
         window_title = self.mp3_config.get("app_window_title", "")
         if not window_title:
-            print("警告：配置文件中未设置 app_window_title")
-            print("将尝试手动激活窗口...")
-            print("等待5秒，请手动切换到目标应用程序...")
+            logger.warning("警告：配置文件中未设置 app_window_title")
+            logger.info("将尝试手动激活窗口...")
+            logger.info("等待5秒，请手动切换到目标应用程序...")
+            _flush_log()
             time.sleep(5)
             return True
         
+        # 已找到过窗口：直接重新激活，不再重复连接
+        if self._app_window is not None:
+            try:
+                self._focus_window(self._app_window)
+                time.sleep(0.1)
+                return True
+            except Exception:
+                # 窗口可能已关闭，重新查找
+                self._app_window = None
+        
         try:
             # 在Windows上，尝试使用pywinauto（如果可用）
             try:
                 from pywinauto import Application
                 app = Application(backend="win32").connect(title_re=f".*{window_title}.*")
-                app.top_window().set_focus()
-                time.sleep(1)
+                window = app.top_window()
+                window.set_focus()
+                self._app_window = window
+                time.sleep(0.1)
                 return True
             except ImportError:
                 # pywinauto未安装，使用pyautogui的方法
@@ -184,79 +453,187 @@ class MP3BatchGenerator:
                     if windows:
                         window = windows[0]
                         window.activate()
-                        time.sleep(1)
+                        self._app_window = window
+                        time.sleep(0.1)
                         return True
             except Exception:
                 pass
             
             # 如果自动定位失败，提示用户手动切换
-            print(f"警告：无法自动定位窗口 '{window_title}'")
-            print("请手动切换到目标应用程序")
-            print("等待5秒后继续...")
+            logger.warning(f"警告：无法自动定位窗口 '{window_title}'")
+            logger.info("请手动切换到目标应用程序")
+            logger.info("等待5秒后继续...")
+            _flush_log()
             time.sleep(5)
             return True
             
         except Exception as e:
-            print(f"警告：无法自动定位窗口: {e}")
-            print("请手动切换到目标应用程序")
-            print("等待5秒后继续...")
+            logger.warning(f"警告：无法自动定位窗口: {e}")
+            logger.info("请手动切换到目标应用程序")
+            logger.info("等待5秒后继续...")
+            _flush_log()
             time.sleep(5)
             return True
     
+    def _focus_window(self, window):
+        """激活已缓存的窗口（pywinauto 窗口用 set_focus，其它用 activate）"""
+        if hasattr(window, 'set_focus'):
+            window.set_focus()
+        else:
+            window.activate()
+    
     def generate_mp3_text(self, name: str, name_english: str) -> str:
         """生成MP3文本格式"""
-        return f"{name}{name}{name_english},{name_english} {name_english} {name_english}。"
+        return _build_mp3_text(name, name_english)
+    
+    def _set_clipboard(self, text: str):
+        """写入剪切板（内容与上次写入相同时跳过，省去一次跨进程剪切板操作）"""
+        if text == self._last_clipboard:
+            return
+        self._last_clipboard = None
+        if len(text) > _NATIVE_CLIPBOARD_THRESHOLD:
+            self._copy_native(text)
+        else:
+            pyperclip.copy(text)
+        self._last_clipboard = text
+    
+    def _copy_native(self, text: str):
+        """通过系统剪切板命令一次性写入长文本，命令不可用时回退到 pyperclip"""
+        if self._clipboard_command is None:
+            self._clipboard_command = _find_clipboard_command() or ()
+        if self._clipboard_command:
+            command, encoding = self._clipboard_command
+            try:
+                subprocess.run(command, input=text.encode(encoding), check=True, timeout=5)
+                return
+            except (OSError, subprocess.SubprocessError):
+                # 命令执行失败，后续直接使用 pyperclip
+                self._clipboard_command = ()
+        pyperclip.copy(text)
     
     def copy_to_clipboard(self, text: str):
         """复制文本到剪切板"""
         try:
-            pyperclip.copy(text)
-            time.sleep(0.2)  # 等待剪切板更新
+            self._set_clipboard(text)
         except Exception as e:
-            print(f"  错误：复制到剪切板失败 - {e}")
+            logger.error(f"  错误：复制到剪切板失败 - {e}")
             raise
     
     def paste_text(self):
         """粘贴文本"""
         try:
             pyautogui.hotkey('ctrl', 'v')
-            time.sleep(0.5)
         except Exception as e:
-            print(f"  错误：粘贴失败 - {e}")
+            logger.error(f"  错误：粘贴失败 - {e}")
             raise
     
     def click_button(self, position: List[int], description: str = "按钮"):
         """点击指定位置的按钮"""
         if not position or len(position) < 2:
-            print(f"  警告：{description}位置未配置")
+            logger.warning(f"  警告：{description}位置未配置")
             return False
         
         try:
             x, y = position[0], position[1]
             pyautogui.click(x, y)
-            time.sleep(0.5)
             return True
         except Exception as e:
-            print(f"  错误：点击{description}失败 - {e}")
+            logger.error(f"  错误：点击{description}失败 - {e}")
             return False
     
+    def _queue_op(self, op: str, args: tuple, wait_after: float, description: str,
+                  message: Optional[str] = None):
+        """执行键盘/剪切板操作（在 macro 中时加入队列，等待批量执行），执行后输出 message"""
+        self._pending_ops.append((op, args, wait_after, description, message))
+        if not self._batch_depth:
+            self._flush_ops()
+    
+    def _flush_ops(self):
+        """连续执行队列中的所有操作（期间不暂停），最后只等待一次"""
+        if not self._pending_ops:
+            return
+        ops, self._pending_ops = self._pending_ops, []
+        
+        # 循环中用到的函数先绑定到局部变量
+        set_clipboard = self._set_clipboard
+        hotkey, press, write = pyautogui.hotkey, pyautogui.press, pyautogui.write
+        
+        pause = pyautogui.PAUSE
+        pyautogui.PAUSE = 0
+        try:
+            for op, args, _, description, message in ops:
+                try:
+                    if op == "hotkey":
+                        hotkey(*args)
+                    elif op == "copy":
+                        set_clipboard(*args)
+                    elif op == "press":
+                        press(*args)
+                    elif op == "write":
+                        write(*args)
+                except Exception as e:
+                    # 出错的是队列中的操作，而不是触发执行的步骤
+                    logger.error(f"  [{description}] 执行失败: {e}")
+                    raise RuntimeError(f"[{description}] {e}") from e
+                if message:
+                    logger.info(f"  [{description}] {message}")
+        finally:
+            pyautogui.PAUSE = pause
+        
+        time.sleep(max(op[2] for op in ops))
+    
+    @contextmanager
+    def batched_ops(self):
+        """代码块中的键盘/剪切板操作进入队列，结束时一次性执行；出错时丢弃队列"""
+        self._batch_depth += 1
+        try:
+            yield
+        except BaseException:
+            self._pending_ops.clear()
+            raise
+        finally:
+            self._batch_depth -= 1
+        if not self._batch_depth:
+            self._flush_ops()
+    
     def wait_for_completion(self, wait_time: float):
         """等待操作完成"""
         time.sleep(wait_time)
     
-    def save_file(self, item_id: int, audio_path: str) -> bool:
+    def _get_mtime_ns(self, path: Path) -> Optional[int]:
+        """获取文件修改时间（文件不存在时返回 None）"""
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+    
+    def _wait_for_file(self, path: Path, timeout: float = 5, interval: float = 0.05,
+                       previous_mtime: Optional[int] = None) -> bool:
+        """轮询等待文件写入：文件出现（或覆盖时修改时间变化）即返回 True；超时或收到停止信号时返回 False"""
+        deadline = time.monotonic() + timeout
+        while True:
+            mtime = self._get_mtime_ns(path)
+            if mtime is not None and mtime != previous_mtime:
+                return True
+            if time.monotonic() >= deadline or self._stop_event.wait(interval):
+                return False
+    
+    def save_file(self, item_id: int, audio_path: str, target_path: Optional[Path] = None) -> bool:
         """保存文件"""
         # 从audio_path提取目录和文件名
         # audio_path格式如: "assets/fruits/200.mp3"
-        target_path = self.base_dir / audio_path
-        target_dir = target_path.parent
+        if target_path is None:
+            target_path = self._base_abs / audio_path
         
         # 确保目录存在
-        target_dir.mkdir(parents=True, exist_ok=True)
+        self._ensure_dir(target_path.parent)
         
         # 检查文件是否已存在
-        if target_path.exists():
-            print(f"  提示：文件已存在，将被覆盖: {target_path}")
+        if self._file_exists(target_path):
+            logger.info(f"  提示：文件已存在，将被覆盖: {target_path}")
+        
+        # 记录保存前的修改时间，用于判断文件是否已被重新写入
+        previous_mtime = self._get_mtime_ns(target_path)
         
         # 获取保存方式配置
         save_method = self.mp3_config.get("save_method", "button")  # "button" 或 "dialog"
@@ -274,20 +651,17 @@ class MP3BatchGenerator:
                 # 在保存对话框中输入文件路径
                 # 先清空输入框
                 pyautogui.hotkey('ctrl', 'a')
-                time.sleep(0.2)
                 
                 # 输入完整路径
-                full_path = str(target_path.absolute())
-                pyperclip.copy(full_path)
-                time.sleep(0.2)
+                full_path = str(target_path)
+                self._set_clipboard(full_path)
                 pyautogui.hotkey('ctrl', 'v')
                 time.sleep(0.5)
                 
                 # 按回车确认保存
                 pyautogui.press('enter')
-                time.sleep(self.mp3_config.get("wait_time_after_save", 1))
             else:
-                print("  警告：保存按钮位置未配置")
+                logger.warning("  警告：保存按钮位置未配置")
                 return False
         elif save_method == "hotkey":
             # 方式2：使用快捷键保存（Ctrl+S）
@@ -296,255 +670,363 @@ class MP3BatchGenerator:
             
             # 在保存对话框中输入文件路径
             pyautogui.hotkey('ctrl', 'a')
-            time.sleep(0.2)
             
-            full_path = str(target_path.absolute())
-            pyperclip.copy(full_path)
-            time.sleep(0.2)
+            full_path = str(target_path)
+            self._set_clipboard(full_path)
             pyautogui.hotkey('ctrl', 'v')
             time.sleep(0.5)
             
             pyautogui.press('enter')
-            time.sleep(self.mp3_config.get("wait_time_after_save", 1))
         else:
-            print(f"  警告：未知的保存方式: {save_method}")
+            logger.warning(f"  警告：未知的保存方式: {save_method}")
             return False
         
-        # 验证文件是否已保存
-        # 等待一段时间让文件系统更新
-        time.sleep(0.5)
-        if target_path.exists():
-            print(f"  ✓ 文件已保存: {target_path}")
+        # 验证文件是否已保存（文件写入后立即返回）
+        timeout = self.mp3_config.get("save_timeout", 5)
+        if self._wait_for_file(target_path, timeout, previous_mtime=previous_mtime):
+            self._remember_file(target_path)
+            logger.info(f"  ✓ 文件已保存: {target_path}")
             return True
+        elif self._check_stop():
+            # 等待被停止信号打断，不是保存失败
+            logger.info(f"  用户中断，未确认文件是否已保存: {target_path}")
+            return False
         else:
-            print(f"  ✗ 文件保存失败或路径不正确: {target_path}")
-            print(f"     请检查应用程序的保存行为，可能需要调整配置")
+            logger.info(f"  ✗ 文件保存失败或路径不正确: {target_path}")
+            logger.info(f"     请检查应用程序的保存行为，可能需要调整配置")
             return False
     
+    # 步骤类型 -> 处理方法名
+    _STEP_HANDLERS = {
+        "generate_text": "_step_generate_text",
+        "copy_to_clipboard": "_step_copy_to_clipboard",
+        "copy_id_to_clipboard": "_step_copy_id_to_clipboard",
+        "select_all": "_step_select_all",
+        "delete": "_step_delete",
+        "activate_window": "_step_activate_window",
+        "click": "_step_click",
+        "paste": "_step_paste",
+        "wait": "_step_wait",
+        "hotkey": "_step_hotkey",
+        "type": "_step_type",
+        "press": "_step_press",
+        "save_file": "_step_save_file",
+        "macro": "_step_macro",
+    }
+    
+    def _compile_step(self, step: Dict) -> Callable[[Dict], Tuple[bool, str]]:
+        """把单个步骤编译为只接收上下文的函数（类型分派和参数解析只做一次）"""
+        step_type = step.get("type", "")
+        params = step.get("params", {})
+        description = step.get("description", step_type)
+        
+        handler_name = self._STEP_HANDLERS.get(step_type)
+        if handler_name is None:
+            return lambda context: (False, f"未知的步骤类型: {step_type}")
+        
+        # 预先编译子步骤（坐标已在加载配置时调整）
+        if step_type == "macro":
+            params = dict(params, _compiled_steps=self._compile_steps(params.get("steps", [])))
+        
+        handler = functools.partial(getattr(self, handler_name), params, description)
+        flush_first = step_type not in _QUEUEABLE_STEPS
+        # 执行时用到的方法在编译时绑定，调用时不再逐次查找属性
+        is_stopped = self._stop_event.is_set
+        flush_ops = self._flush_ops
+        
+        def run(context: Dict) -> Tuple[bool, str]:
+            # 在执行前检查是否应该停止
+            if is_stopped():
+                return False, "用户中断"
+            try:
+                # macro 中的非键盘/剪切板步骤执行前，先把队列中的操作执行完
+                if flush_first:
+                    flush_ops()
+                return handler(context)
+            except Exception as e:
+                return False, f"执行步骤失败: {str(e)}"
+        
+        return run
+    
+    def _compile_condition(self, step: Dict) -> Optional[Callable[[Dict], bool]]:
+        """编译条件步骤的判断函数（返回 True 表示跳过子步骤；无条件时返回 None）"""
+        params = step.get("params", {})
+        description = step.get("description", step.get("type", ""))
+        condition = params.get("condition", "always")
+        
+        if condition == "skip_if_exists":
+            def skip_if_exists(context: Dict) -> bool:
+                target_path = context.get("target_path")
+                if target_path is not None and self._file_exists(target_path):
+                    logger.info(f"  [{description}] 跳过：文件已存在")
+                    return True
+                return False
+            return skip_if_exists
+        
+        if condition == "skip_if_fresh":
+            def skip_if_fresh(context: Dict) -> bool:
+                target_path = context.get("target_path")
+                if target_path is None:
+                    return False
+                mtime = self._file_mtime(target_path)
+                # 未读取过数据文件时退化为 skip_if_exists
+                if mtime is not None and (self._json_mtime is None or mtime >= self._json_mtime):
+                    logger.info(f"  [{description}] 跳过：文件比数据文件新")
+                    return True
+                return False
+            return skip_if_fresh
+        
+        return None
+    
+    def _compile_steps(self, steps: List[Dict], program: Optional[List[Tuple]] = None) -> List[Tuple]:
+        """把步骤列表编译为线性指令序列，conditional 步骤展开为跳转指令，执行时无需递归"""
+        if program is None:
+            program = []
+        for step in steps:
+            if step.get("type") != "conditional":
+                program.append((_CALL, self._compile_step(step), None))
+                continue
+            
+            # 条件成立时跳过子步骤：先占位，子步骤编译完后再填入跳转目标
+            guard = self._compile_condition(step)
+            jump_index = len(program)
+            if guard is not None:
+                program.append(None)
+            self._compile_steps(step.get("params", {}).get("steps", []), program)
+            if guard is not None:
+                program[jump_index] = (_JUMP_IF_TRUE, guard, len(program))
+        return program
+    
+    def _run_program(self, program: List[Tuple], context: Dict) -> Tuple[bool, str]:
+        """执行编译后的指令序列"""
+        call = _CALL
+        pc = 0
+        end = len(program)
+        while pc < end:
+            op, fn, target = program[pc]
+            if op == call:
+                success, message = fn(context)
+                if not success:
+                    return False, message
+                pc += 1
+            elif fn(context):
+                pc = target
+            else:
+                pc += 1
+        return True, ""
+    
     def execute_step(self, step: Dict, context: Dict) -> Tuple[bool, str]:
         """执行单个操作步骤"""
-        # 在执行前检查是否应该停止
-        if self._check_stop():
+        return self._run_program(self._compile_steps([step]), context)
+    
+    def _step_generate_text(self, params: Dict, description: str, context: Dict) -> Tuple[bool, str]:
+        """生成文本并存储到上下文（已预处理时直接使用）"""
+        mp3_text = context.get("prepared_mp3_text", "")
+        if not mp3_text:
+            name = context.get("name", "")
+            name_english = context.get("name_english", "")
+            mp3_text = self.generate_mp3_text(name, name_english)
+        context["mp3_text"] = mp3_text
+        logger.info(f"  [{description}] 生成文本: {mp3_text}")
+        return True, ""
+    
+    def _step_copy_to_clipboard(self, params: Dict, description: str, context: Dict) -> Tuple[bool, str]:
+        """复制文本到剪切板"""
+        text = context.get("mp3_text", "")
+        if not text:
+            return False, "上下文中没有文本可复制"
+        self._queue_op("copy", (text,), 0, description, "已复制到剪切板")
+        return True, ""
+    
+    def _step_copy_id_to_clipboard(self, params: Dict, description: str, context: Dict) -> Tuple[bool, str]:
+        """复制ID到剪切板"""
+        item_id = context.get("item_id", "")
+        if not item_id:
+            return False, "上下文中没有ID可复制"
+        self._queue_op("copy", (str(item_id),), 0, description, f"已复制ID到剪切板: {item_id}")
+        return True, ""
+    
+    def _step_select_all(self, params: Dict, description: str, context: Dict) -> Tuple[bool, str]:
+        """全选（Ctrl+A）"""
+        self._queue_op("hotkey", ('ctrl', 'a'), params.get("wait_after", 0.1), description, "已全选")
+        return True, ""
+    
+    def _step_delete(self, params: Dict, description: str, context: Dict) -> Tuple[bool, str]:
+        """删除（Delete键）"""
+        self._queue_op("press", ('delete',), params.get("wait_after", 0.1), description, "已删除")
+        return True, ""
+    
+    def _step_activate_window(self, params: Dict, description: str, context: Dict) -> Tuple[bool, str]:
+        """激活窗口"""
+        if not self.find_app_window():
+            return False, "无法找到或激活目标应用程序窗口"
+        logger.info(f"  [{description}] 窗口已激活")
+        return True, ""
+    
+    def _step_click(self, params: Dict, description: str, context: Dict) -> Tuple[bool, str]:
+        """点击指定位置（坐标已在加载配置时调整）"""
+        if "_adjusted_position" not in params:
+            return False, f"点击位置未配置: {description}"
+        x, y = params["position"][0], params["position"][1]
+        x_adjusted, y_adjusted = params["_adjusted_position"]
+        
+        pyautogui.click(x_adjusted, y_adjusted)
+        wait_time = params.get("wait_after", 0.5)
+        time.sleep(wait_time)
+        logger.info(f"  [{description}] 已点击位置 ({x}, {y}) -> ({x_adjusted}, {y_adjusted})")
+        return True, ""
+    
+    def _step_paste(self, params: Dict, description: str, context: Dict) -> Tuple[bool, str]:
+        """粘贴文本"""
+        self._queue_op("hotkey", ('ctrl', 'v'), params.get("wait_after", 0.5), description, "已粘贴")
+        return True, ""
+    
+    def _step_wait(self, params: Dict, description: str, context: Dict) -> Tuple[bool, str]:
+        """等待指定时间（支持中断）"""
+        wait_time = params.get("duration", 1)
+        logger.info(f"  [{description}] 等待 {wait_time} 秒...")
+        _flush_log()
+        
+        # 收到停止信号时立即返回
+        if self._stop_event.wait(timeout=wait_time):
             return False, "用户中断"
+        return True, ""
+    
+    def _step_hotkey(self, params: Dict, description: str, context: Dict) -> Tuple[bool, str]:
+        """按下快捷键"""
+        keys = params.get("keys", [])
+        if not keys:
+            return False, "快捷键未配置"
+        self._queue_op("hotkey", tuple(keys), params.get("wait_after", 0.5), description,
+                       f"已按下快捷键: {'+'.join(keys)}")
+        return True, ""
+    
+    def _step_type(self, params: Dict, description: str, context: Dict) -> Tuple[bool, str]:
+        """输入文本"""
+        text = params.get("text", "")
+        if not text:
+            # 尝试从上下文获取
+            text = context.get("mp3_text", "")
+        if not text:
+            return False, "没有文本可输入"
+        wait_after = params.get("wait_after", 0.5)
+        if params.get("use_keystrokes", False):
+            # 逐字符模拟按键（较慢，仅在目标程序不支持粘贴时使用）
+            self._queue_op("write", (text, 0.1), wait_after, description, "已输入文本")
+        else:
+            # 通过剪切板粘贴，耗时与文本长度无关
+            self._queue_op("copy", (text,), 0, description)
+            self._queue_op("hotkey", ('ctrl', 'v'), wait_after, description, "已输入文本")
+        return True, ""
+    
+    def _step_press(self, params: Dict, description: str, context: Dict) -> Tuple[bool, str]:
+        """按下单个键"""
+        key = params.get("key", "")
+        if not key:
+            return False, "按键未配置"
+        self._queue_op("press", (key,), params.get("wait_after", 0.5), description, f"已按下键: {key}")
+        return True, ""
+    
+    def _step_save_file(self, params: Dict, description: str, context: Dict) -> Tuple[bool, str]:
+        """保存文件"""
+        target_path = context.get("target_path")
+        if target_path is None:
+            return False, "音频路径为空"
         
-        step_type = step.get("type", "")
-        params = step.get("params", {})
-        description = step.get("description", step_type)
+        self._ensure_dir(target_path.parent)
+        previous_mtime = self._get_mtime_ns(target_path)
+        
+        # 获取保存方式
+        save_method = params.get("method", "dialog")  # "dialog" 或 "hotkey"
+        
+        if save_method == "hotkey":
+            # 使用快捷键打开保存对话框
+            pyautogui.hotkey('ctrl', 's')
+            time.sleep(1)
+        elif save_method == "button":
+            # 点击保存按钮（坐标已在加载配置时调整）
+            if "_adjusted_button_position" not in params:
+                return False, "保存按钮位置未配置"
+            x_adjusted, y_adjusted = params["_adjusted_button_position"]
+            pyautogui.click(x_adjusted, y_adjusted)
+            time.sleep(1)
         
+        # 在保存对话框中输入文件路径
+        pyautogui.hotkey('ctrl', 'a')
+        
+        full_path = str(target_path)
+        self._set_clipboard(full_path)
+        pyautogui.hotkey('ctrl', 'v')
+        time.sleep(0.5)
+        
+        # 按回车确认保存
+        pyautogui.press('enter')
+        
+        # 验证文件是否已保存（文件写入后立即返回）
+        if self._wait_for_file(target_path, params.get("timeout", 5), previous_mtime=previous_mtime):
+            self._remember_file(target_path)
+            logger.info(f"  [{description}] ✓ 文件已保存: {target_path}")
+            return True, ""
+        elif self._check_stop():
+            # 等待被停止信号打断，不是保存失败
+            return False, "用户中断"
+        else:
+            logger.info(f"  [{description}] ✗ 文件保存失败: {target_path}")
+            return False, "文件保存失败或路径不正确"
+    
+    def _step_macro(self, params: Dict, description: str, context: Dict) -> Tuple[bool, str]:
+        """宏步骤：子步骤合并为一次操作，最后只等待一次"""
+        with self.batched_ops():
+            success, msg = self._run_program(params["_compiled_steps"], context)
+            if not success:
+                self._pending_ops.clear()
+                return False, msg
+            if "wait_after" in params:
+                wait_after = params["wait_after"]
+                self._pending_ops = [(op, args, wait_after, desc, message)
+                                     for op, args, _, desc, message in self._pending_ops]
+        logger.info(f"  [{description}] 宏步骤已执行")
+        return True, ""
+    
+    def _prepare_item(self, item: Dict) -> Optional[Dict]:
+        """预处理项目（在后台线程执行）：生成文本、创建目录、扫描已存在文件，返回预处理结果"""
         try:
-            if step_type == "generate_text":
-                # 生成文本并存储到上下文
-                name = context.get("name", "")
-                name_english = context.get("name_english", "")
-                mp3_text = self.generate_mp3_text(name, name_english)
-                context["mp3_text"] = mp3_text
-                print(f"  [{description}] 生成文本: {mp3_text}")
-                return True, ""
-                
-            elif step_type == "copy_to_clipboard":
-                # 复制文本到剪切板
-                text = context.get("mp3_text", "")
-                if not text:
-                    return False, "上下文中没有文本可复制"
-                self.copy_to_clipboard(text)
-                print(f"  [{description}] 已复制到剪切板")
-                return True, ""
-                
-            elif step_type == "copy_id_to_clipboard":
-                # 复制ID到剪切板
-                item_id = context.get("item_id", "")
-                if not item_id:
-                    return False, "上下文中没有ID可复制"
-                self.copy_to_clipboard(str(item_id))
-                print(f"  [{description}] 已复制ID到剪切板: {item_id}")
-                return True, ""
-                
-            elif step_type == "select_all":
-                # 全选（Ctrl+A）
-                pyautogui.hotkey('ctrl', 'a')
-                wait_time = params.get("wait_after", 0.1)
-                time.sleep(wait_time)
-                print(f"  [{description}] 已全选")
-                return True, ""
-                
-            elif step_type == "delete":
-                # 删除（Delete键）
-                pyautogui.press('delete')
-                wait_time = params.get("wait_after", 0.1)
-                time.sleep(wait_time)
-                print(f"  [{description}] 已删除")
-                return True, ""
-                
-            elif step_type == "activate_window":
-                # 激活窗口
-                if not self.find_app_window():
-                    return False, "无法找到或激活目标应用程序窗口"
-                print(f"  [{description}] 窗口已激活")
-                return True, ""
-                
-            elif step_type == "click":
-                # 点击指定位置
-                position = params.get("position")
-                if not position or len(position) < 2:
-                    return False, f"点击位置未配置: {description}"
-                x, y = position[0], position[1]
-                
-                # 调整坐标（处理DPI缩放和偏移）
-                x_adjusted, y_adjusted = self._adjust_coordinate(x, y)
-                
-                pyautogui.click(x_adjusted, y_adjusted)
-                wait_time = params.get("wait_after", 0.5)
-                time.sleep(wait_time)
-                print(f"  [{description}] 已点击位置 ({x}, {y}) -> ({x_adjusted}, {y_adjusted})")
-                return True, ""
-                
-            elif step_type == "paste":
-                # 粘贴文本
-                self.paste_text()
-                wait_time = params.get("wait_after", 0.5)
-                time.sleep(wait_time)
-                print(f"  [{description}] 已粘贴")
-                return True, ""
-                
-            elif step_type == "wait":
-                # 等待指定时间（支持中断）
-                wait_time = params.get("duration", 1)
-                print(f"  [{description}] 等待 {wait_time} 秒...")
-                
-                # 分段等待，每0.5秒检查一次是否应该停止
-                elapsed = 0
-                check_interval = 0.5
-                while elapsed < wait_time:
-                    if self._check_stop():
-                        return False, "用户中断"
-                    sleep_time = min(check_interval, wait_time - elapsed)
-                    time.sleep(sleep_time)
-                    elapsed += sleep_time
-                
-                return True, ""
-                
-            elif step_type == "hotkey":
-                # 按下快捷键
-                keys = params.get("keys", [])
-                if not keys:
-                    return False, "快捷键未配置"
-                pyautogui.hotkey(*keys)
-                wait_time = params.get("wait_after", 0.5)
-                time.sleep(wait_time)
-                print(f"  [{description}] 已按下快捷键: {'+'.join(keys)}")
-                return True, ""
-                
-            elif step_type == "type":
-                # 输入文本
-                text = params.get("text", "")
-                if not text:
-                    # 尝试从上下文获取
-                    text = context.get("mp3_text", "")
-                if not text:
-                    return False, "没有文本可输入"
-                pyautogui.write(text, interval=0.1)
-                wait_time = params.get("wait_after", 0.5)
-                time.sleep(wait_time)
-                print(f"  [{description}] 已输入文本")
-                return True, ""
-                
-            elif step_type == "press":
-                # 按下单个键
-                key = params.get("key", "")
-                if not key:
-                    return False, "按键未配置"
-                pyautogui.press(key)
-                wait_time = params.get("wait_after", 0.5)
-                time.sleep(wait_time)
-                print(f"  [{description}] 已按下键: {key}")
-                return True, ""
-                
-            elif step_type == "save_file":
-                # 保存文件
-                item_id = context.get("item_id", 0)
-                audio_path = context.get("audio_path", "")
-                if not audio_path:
-                    return False, "音频路径为空"
-                
-                target_path = self.base_dir / audio_path
-                target_dir = target_path.parent
-                target_dir.mkdir(parents=True, exist_ok=True)
-                
-                # 获取保存方式
-                save_method = params.get("method", "dialog")  # "dialog" 或 "hotkey"
-                
-                if save_method == "hotkey":
-                    # 使用快捷键打开保存对话框
-                    pyautogui.hotkey('ctrl', 's')
-                    time.sleep(1)
-                elif save_method == "button":
-                    # 点击保存按钮
-                    save_button_pos = params.get("button_position")
-                    if save_button_pos:
-                        x, y = save_button_pos[0], save_button_pos[1]
-                        x_adjusted, y_adjusted = self._adjust_coordinate(x, y)
-                        pyautogui.click(x_adjusted, y_adjusted)
-                        time.sleep(1)
-                    else:
-                        return False, "保存按钮位置未配置"
-                
-                # 在保存对话框中输入文件路径
-                pyautogui.hotkey('ctrl', 'a')
-                time.sleep(0.2)
-                
-                full_path = str(target_path.absolute())
-                pyperclip.copy(full_path)
-                time.sleep(0.2)
-                pyautogui.hotkey('ctrl', 'v')
-                time.sleep(0.5)
-                
-                # 按回车确认保存
-                pyautogui.press('enter')
-                wait_time = params.get("wait_after", 1)
-                time.sleep(wait_time)
-                
-                # 验证文件是否已保存
-                time.sleep(0.5)
-                if target_path.exists():
-                    print(f"  [{description}] ✓ 文件已保存: {target_path}")
-                    return True, ""
-                else:
-                    print(f"  [{description}] ✗ 文件保存失败: {target_path}")
-                    return False, "文件保存失败或路径不正确"
-                
-            elif step_type == "conditional":
-                # 条件步骤：根据条件决定是否执行
-                condition = params.get("condition", "always")
-                if condition == "skip_if_exists":
-                    audio_path = context.get("audio_path", "")
-                    if audio_path:
-                        target_path = self.base_dir / audio_path
-                        if target_path.exists():
-                            print(f"  [{description}] 跳过：文件已存在")
-                            return True, "文件已存在，已跳过"
-                
-                # 执行子步骤
-                sub_steps = params.get("steps", [])
-                for sub_step in sub_steps:
-                    success, msg = self.execute_step(sub_step, context)
-                    if not success:
-                        return False, msg
-                return True, ""
-                
-            else:
-                return False, f"未知的步骤类型: {step_type}"
-                
-        except Exception as e:
-            return False, f"执行步骤失败: {str(e)}"
+            name = item.get('name', '').strip()
+            name_english = item.get('name_english', '').strip()
+            audio_path = item.get('audio', '')
+            if not (name and name_english and audio_path):
+                return None
+            
+            target_path = self._base_abs / audio_path
+            self._ensure_dir(target_path.parent)
+            self._file_exists(target_path)
+            
+            return {
+                "name": name,
+                "name_english": name_english,
+                "mp3_text": self.generate_mp3_text(name, name_english),
+            }
+        except Exception:
+            # 预处理只是优化，失败时由 process_single_item 正常处理
+            return None
     
-    def process_single_item(self, item: Dict, index: int, total: int) -> Tuple[bool, str]:
-        """处理单个项目"""
+    def process_single_item(self, item: Dict, index: int, total: Optional[int],
+                            prepared: Optional[Dict] = None) -> Tuple[bool, str]:
+        """处理单个项目（total 为 None 表示总数未知，prepared 为后台预处理结果），结束后输出该项目的日志"""
+        try:
+            return self._process_item(item, index, total, prepared)
+        finally:
+            _flush_log()
+    
+    def _process_item(self, item: Dict, index: int, total: Optional[int],
+                      prepared: Optional[Dict] = None) -> Tuple[bool, str]:
+        """按配置的步骤处理单个项目"""
         item_id = item.get('id', 'N/A')
         name = item.get('name', '').strip()
         name_english = item.get('name_english', '').strip()
         audio_path = item.get('audio', '')
         
-        print(f"\n[{index}/{total}] 处理项目 ID {item_id}: {name} ({name_english})")
+        logger.info(f"\n[{index}/{total if total is not None else '?'}] 处理项目 ID {item_id}: {name} ({name_english})")
         
         # 检查必要字段
         if not name:
@@ -555,39 +1037,40 @@ class MP3BatchGenerator:
             return False, "音频路径为空"
         
         # 检查文件是否已存在（可选：跳过已存在的文件）
-        target_path = self.base_dir / audio_path
+        target_path = self._base_abs / audio_path
         skip_existing = self.mp3_config.get("skip_existing", False)
-        if skip_existing and target_path.exists():
-            print(f"  跳过：文件已存在")
+        if skip_existing and self._file_exists(target_path):
+            logger.info(f"  跳过：文件已存在")
             return True, "文件已存在，已跳过"
         
-        # 准备上下文数据
+        # 准备上下文数据（使用后台预处理的结果，名字不一致时不使用）
+        if not prepared or prepared.get("name") != name or prepared.get("name_english") != name_english:
+            prepared = {}
         context = {
             "item_id": item_id,
             "name": name,
             "name_english": name_english,
             "audio_path": audio_path,
-            "mp3_text": ""
+            "target_path": target_path,
+            "mp3_text": "",
+            "prepared_mp3_text": prepared.get("mp3_text", "")
         }
         
-        # 获取操作步骤配置
-        steps = self.mp3_config.get("steps", [])
+        # 获取编译后的操作步骤
+        if self._compiled_steps is None:
+            self._compiled_steps = self._compile_steps(self.mp3_config.get("steps", []))
         
         # 如果没有配置步骤，使用默认步骤（向后兼容）
-        if not steps:
-            print("  警告：未配置操作步骤，使用默认步骤")
+        if not self._compiled_steps:
+            logger.warning("  警告：未配置操作步骤，使用默认步骤")
             return self._process_with_default_steps(context)
         
         # 按配置的步骤顺序执行
         try:
-            for step in steps:
-                # 检查是否应该停止
-                if self._check_stop():
-                    return False, "用户中断"
-                
-                success, message = self.execute_step(step, context)
-                if not success:
-                    return False, message
+            # 每个步骤执行前都会检查是否应该停止
+            success, message = self._run_program(self._compiled_steps, context)
+            if not success:
+                return False, message
             
             # 最后检查一次
             if self._check_stop():
@@ -606,7 +1089,7 @@ class MP3BatchGenerator:
             # 1. 生成文本
             mp3_text = self.generate_mp3_text(context["name"], context["name_english"])
             context["mp3_text"] = mp3_text
-            print(f"  生成文本: {mp3_text}")
+            logger.info(f"  生成文本: {mp3_text}")
             
             # 2. 复制到剪切板
             self.copy_to_clipboard(mp3_text)
@@ -622,6 +1105,7 @@ class MP3BatchGenerator:
                 time.sleep(0.3)
             
             self.paste_text()
+            time.sleep(0.5)
             
             # 5. 点击生成按钮
             generate_pos = self.mp3_config.get("generate_button_position")
@@ -633,12 +1117,12 @@ class MP3BatchGenerator:
             
             # 6. 等待生成完成
             wait_time = self.mp3_config.get("wait_time_after_generate", 3)
-            print(f"  等待生成完成 ({wait_time}秒)...")
+            logger.info(f"  等待生成完成 ({wait_time}秒)...")
             self.wait_for_completion(wait_time)
             
             # 7. 保存文件
-            if not self.save_file(context["item_id"], context["audio_path"]):
-                return False, "保存文件失败"
+            if not self.save_file(context["item_id"], context["audio_path"], context["target_path"]):
+                return False, "用户中断" if self._check_stop() else "保存文件失败"
             
             return True, "成功"
             
@@ -647,29 +1131,51 @@ class MP3BatchGenerator:
     
     def batch_generate(self, json_file: str, start_index: int = 0, end_index: Optional[int] = None) -> Dict:
         """批量生成MP3"""
-        print("=" * 60)
-        print("批量生成MP3工具")
-        print("=" * 60)
+        logger.info("=" * 60)
+        logger.info("批量生成MP3工具")
+        logger.info("=" * 60)
         
-        # 加载JSON数据
+        # 加载JSON数据（可能是流式迭代器，此时总数未知）
         data = self.load_json_data(json_file)
-        if not data:
+        try:
+            return self._batch_generate(data, start_index, end_index)
+        finally:
+            # 流式读取提前结束时（指定了结束索引或用户中断）立即关闭JSON文件，不等垃圾回收
+            if not isinstance(data, list):
+                data.close()
+    
+    def _batch_generate(self, data: Iterable[Dict], start_index: int, end_index: Optional[int]) -> Dict:
+        """处理加载好的数据中指定范围内的项目"""
+        total = len(data) if isinstance(data, list) else None
+        if total == 0:
             return {"success": 0, "failed": 0, "errors": []}
         
         # 确定处理范围
-        total = len(data)
-        if end_index is None:
-            end_index = total
-        else:
-            end_index = min(end_index, total)
+        start_index = max(0, start_index)
+        if total is not None:
+            end_index = total if end_index is None else min(end_index, total)
+        if end_index is not None and start_index >= end_index:
+            logger.error(f"错误：处理范围为空（起始索引 {start_index}，结束索引 {end_index}，项目总数 {total if total is not None else '未知'}）")
+            _flush_log()
+            return {"success": 0, "failed": 0, "errors": []}
+        items_to_process = itertools.islice(data, start_index, end_index)
+        
+        # 存在性缓存按目录在首次检查时扫描，每次批量处理重新开始
+        self._existing_files.clear()
+        self._scanned_dirs.clear()
+        self._mkdir_cache.clear()
         
-        items_to_process = data[start_index:end_index]
-        actual_total = len(items_to_process)
+        # 操作步骤只编译一次，每个项目直接调用
+        self._compiled_steps = self._compile_steps(self.mp3_config.get("steps", []))
         
-        print(f"\n将处理 {actual_total} 个项目 (索引 {start_index} 到 {end_index-1})")
-        print(f"目标应用程序: {self.mp3_config.get('app_window_title', '未配置')}")
-        print("\n提示：请确保目标TTS应用程序已打开并准备好")
-        print("5秒后开始处理...")
+        if end_index is not None:
+            logger.info(f"\n将处理 {end_index - start_index} 个项目 (索引 {start_index} 到 {end_index-1})")
+        else:
+            logger.info(f"\n将处理从索引 {start_index} 开始的所有项目")
+        logger.info(f"目标应用程序: {self.mp3_config.get('app_window_title', '未配置')}")
+        logger.info("\n提示：请确保目标TTS应用程序已打开并准备好")
+        logger.info("5秒后开始处理...")
+        _flush_log()
         time.sleep(5)
         
         # 统计结果
@@ -677,43 +1183,64 @@ class MP3BatchGenerator:
         failed_count = 0
         errors = []
         
-        # 处理每个项目
-        for i, item in enumerate(items_to_process, start=1):
-            # 检查是否应该停止
-            if self._check_stop():
-                print("\n用户中断，停止处理")
-                break
-            
-            success, message = self.process_single_item(item, start_index + i, total)
+        delay = self.mp3_config.get("delay_between_items", 1)
+        
+        # 后台线程提前准备下一个项目，与当前项目的GUI操作和等待重叠
+        items_iter = iter(items_to_process)
+        next_item = next(items_iter, None)
+        
+        with ThreadPoolExecutor(max_workers=1) as prefetch_pool:
+            if next_item is not None:
+                self._prefetch_future = prefetch_pool.submit(self._prepare_item, next_item)
             
-            if success:
-                success_count += 1
-            else:
-                failed_count += 1
-                item_id = item.get('id', 'N/A')
-                errors.append(f"ID {item_id}: {message}")
+            # 处理每个项目
+            i = 0
+            while next_item is not None:
+                item = next_item
+                i += 1
+                
+                # 项目之间的延迟
+                if i > 1 and delay > 0:
+                    self._stop_event.wait(delay)
                 
-                # 如果用户中断，停止处理
-                if self._check_stop() or message == "用户中断":
-                    print("\n用户中断，停止处理")
+                # 检查是否应该停止
+                if self._check_stop():
+                    logger.info("\n用户中断，停止处理")
                     break
-            
-            # 项目之间的延迟
-            if i < actual_total and not self._check_stop():
-                delay = self.mp3_config.get("delay_between_items", 1)
-                if delay > 0:
-                    time.sleep(delay)
+                
+                # 等待当前项目预处理完成，并开始预处理下一个项目
+                prepared = self._prefetch_future.result()
+                next_item = next(items_iter, None)
+                if next_item is not None:
+                    self._prefetch_future = prefetch_pool.submit(self._prepare_item, next_item)
+                
+                success, message = self.process_single_item(item, start_index + i, total, prepared)
+                
+                if success:
+                    success_count += 1
+                else:
+                    failed_count += 1
+                    item_id = item.get('id', 'N/A')
+                    errors.append(f"ID {item_id}: {message}")
+                    
+                    # 如果用户中断，停止处理
+                    if self._check_stop() or message == "用户中断":
+                        logger.info("\n用户中断，停止处理")
+                        break
+        
+        self._prefetch_future = None
         
         # 输出结果
-        print("\n" + "=" * 60)
-        print("处理完成！")
-        print(f"成功: {success_count}")
-        print(f"失败: {failed_count}")
+        logger.info("\n" + "=" * 60)
+        logger.info("处理完成！")
+        logger.info(f"成功: {success_count}")
+        logger.info(f"失败: {failed_count}")
         if errors:
-            print("\n错误详情:")
+            logger.info("\n错误详情:")
             for error in errors:
-                print(f"  - {error}")
-        print("=" * 60)
+                logger.info(f"  - {error}")
+        logger.info("=" * 60)
+        _flush_log()
         
         return {
             "success": success_count,
@@ -741,10 +1268,10 @@ def main():
         if result["failed"] > 0:
             sys.exit(1)
     except KeyboardInterrupt:
-        print("\n\n已中断")
+        logger.info("\n\n已中断")
         sys.exit(1)
     except Exception as e:
-        print(f"\n错误: {e}")
+        logger.error(f"\n错误: {e}")
         import traceback
         traceback.print_exc()
         sys.exit(1)
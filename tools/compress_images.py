@@ -5,14 +5,45 @@
 批量压缩图片，减少文件体积，保持原始分辨率不变
 """
 
+import io
 import os
+import shutil
 import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from PIL import Image
+from PIL import Image, features
 import argparse
 
+# 可选依赖：安装了 PyTurboJPEG（及 libturbojpeg）时，不做哈夫曼表优化的JPEG输入直接转码，不经过Pillow
+try:
+    from turbojpeg import TurboJPEG, TJFLAG_PROGRESSIVE, TJSAMP_420
+    _turbo_jpeg = TurboJPEG()
+except Exception:
+    _turbo_jpeg = None
 
-def compress_image(input_path, output_path, quality=85, optimize=True):
+# 可选依赖：安装了 numpy 时，透明图片与白色背景的合成一次完成
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+JPEG_SUFFIXES = {'.jpg', '.jpeg'}
+
+# 渐进式编码时，超过该像素数的大图不再做第二遍哈夫曼表优化（收益有限、耗时明显）
+PROGRESSIVE_OPTIMIZE_MAX_PIXELS = 4_000_000
+
+# 备份线程最多提前备份的图片数
+BACKUP_AHEAD = 2
+
+
+def _bpp_threshold(quality):
+    """估算指定质量下重新编码后的每像素比特数（quality=85 时约1.5）"""
+    return quality * 0.0175
+
+
+def compress_image(input_path, output_path, quality=85, optimize=True, original_size=None,
+                   progressive=False, output_format='jpeg'):
     """
     压缩单张图片
     
@@ -21,13 +52,53 @@ def compress_image(input_path, output_path, quality=85, optimize=True):
         output_path: 输出图片路径
         quality: JPEG质量 (1-100，数值越小文件越小，但质量越低)
         optimize: 是否优化压缩
+        original_size: 输入文件大小（调用方已知时传入，省去一次 stat）
+        progressive: 是否使用渐进式JPEG编码
+        output_format: 输出格式，'jpeg' 或 'webp'（webp 保留透明通道）
     """
     try:
+        # 在覆盖原文件之前取得原始大小
+        if original_size is None:
+            original_size = os.path.getsize(input_path)
+        
+        is_jpeg = output_format == 'jpeg' and Path(input_path).suffix.lower() in JPEG_SUFFIXES
+        
+        # 已经足够小的JPEG（每像素比特数低于目标质量的估算值）不再重新编码
+        # Image.open 只读取文件头，不会解码图像数据
+        if is_jpeg:
+            with Image.open(input_path) as probe:
+                width, height = probe.size
+            if original_size * 8 / (width * height) < _bpp_threshold(quality):
+                if Path(output_path) != Path(input_path):
+                    shutil.copy2(input_path, output_path)
+                return {
+                    'success': True,
+                    'skipped': True,
+                    'original_size': original_size,
+                    'compressed_size': original_size,
+                    'reduction': 0.0
+                }
+        
+        # JPEG输入无需转换颜色模式，直接用 TurboJPEG 解码后重新编码
+        # （TurboJPEG 不支持哈夫曼表优化，只在不要求优化时使用，避免输出文件变大）
+        if _turbo_jpeg is not None and is_jpeg and not optimize:
+            result = _transcode_jpeg(input_path, output_path, quality, progressive)
+            if result is not None:
+                return result
+        
         # 打开图片
         img = Image.open(input_path)
         
+        if output_format == 'webp':
+            # WebP 支持透明度，保留4通道的RGBA，不需要与白色背景合成
+            if img.mode in ('LA', 'P', 'PA'):
+                img = img.convert('RGBA')
+            elif img.mode not in ('RGB', 'RGBA'):
+                img = img.convert('RGB')
         # 如果是RGBA模式，转换为RGB（JPEG不支持透明度）
-        if img.mode in ('RGBA', 'LA', 'P'):
+        elif img.mode in ('RGBA', 'LA', 'P') and np is not None:
+            img = _composite_on_white(img)
+        elif img.mode in ('RGBA', 'LA', 'P'):
             # 创建白色背景
             background = Image.new('RGB', img.size, (255, 255, 255))
             if img.mode == 'P':
@@ -37,17 +108,27 @@ def compress_image(input_path, output_path, quality=85, optimize=True):
         elif img.mode != 'RGB':
             img = img.convert('RGB')
         
-        # 保存压缩后的图片
-        img.save(
-            output_path,
-            'JPEG',
-            quality=quality,
-            optimize=optimize
-        )
+        # 渐进式编码时，大图跳过第二遍哈夫曼表优化
+        if progressive and img.width * img.height > PROGRESSIVE_OPTIMIZE_MAX_PIXELS:
+            optimize = False
+        
+        # 先编码到内存，得到压缩后的大小后一次写入文件
+        buffer = io.BytesIO()
+        if output_format == 'webp':
+            img.save(buffer, 'WEBP', quality=quality, method=4)
+        else:
+            img.save(
+                buffer,
+                'JPEG',
+                quality=quality,
+                optimize=optimize,
+                progressive=progressive
+            )
+        data = buffer.getbuffer()
+        compressed_size = data.nbytes
+        with open(output_path, 'wb') as f:
+            f.write(data)
         
-        # 获取文件大小
-        original_size = os.path.getsize(input_path)
-        compressed_size = os.path.getsize(output_path)
         reduction = (1 - compressed_size / original_size) * 100
         
         return {
@@ -63,7 +144,70 @@ def compress_image(input_path, output_path, quality=85, optimize=True):
         }
 
 
-def compress_directory(directory, quality=85, optimize=True, backup=True, output_dir=None):
+def _composite_on_white(img):
+    """使用 numpy 把带透明通道的图片合成到白色背景上，返回RGB图片"""
+    arr = np.asarray(img.convert('RGBA'))
+    alpha = arr[..., 3:4].astype(np.uint16)
+    rgb = (arr[..., :3].astype(np.uint16) * alpha + 255 * (255 - alpha) + 127) // 255
+    return Image.fromarray(rgb.astype(np.uint8), 'RGB')
+
+
+def _transcode_jpeg(input_path, output_path, quality, progressive=False):
+    """使用 TurboJPEG 重新编码JPEG（无法处理时返回 None，由Pillow处理）"""
+    with open(input_path, 'rb') as f:
+        data = f.read()
+    try:
+        flags = TJFLAG_PROGRESSIVE if progressive else 0
+        # 与Pillow的默认设置一致，使用4:2:0色度抽样
+        encoded = _turbo_jpeg.encode(_turbo_jpeg.decode(data), quality=quality,
+                                     jpeg_subsample=TJSAMP_420, flags=flags)
+    except Exception:
+        # CMYK等TurboJPEG不支持的JPEG
+        return None
+    
+    with open(output_path, 'wb') as f:
+        f.write(encoded)
+    
+    original_size = len(data)
+    compressed_size = len(encoded)
+    return {
+        'success': True,
+        'original_size': original_size,
+        'compressed_size': compressed_size,
+        'reduction': (1 - compressed_size / original_size) * 100
+    }
+
+
+def has_libjpeg_turbo():
+    """检查Pillow是否链接了 libjpeg-turbo（SIMD加速的JPEG编解码）"""
+    try:
+        return bool(features.check_feature('libjpeg_turbo'))
+    except Exception:
+        return False
+
+
+def _compress_one(task):
+    """进程池任务：解包参数后压缩单张图片"""
+    img_file, output_file, quality, optimize, original_size, progressive, output_format = task
+    return compress_image(img_file, output_file, quality, optimize, original_size, progressive, output_format)
+
+
+def format_size(size):
+    """格式化文件大小"""
+    for unit in ['B', 'KB', 'MB']:
+        if size < 1024.0:
+            return f"{size:.2f} {unit}"
+        size /= 1024.0
+    return f"{size:.2f} GB"
+
+
+def default_jobs():
+    """默认并行进程数：保留一个CPU核心"""
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+def compress_directory(directory, quality=85, optimize=True, backup=True, output_dir=None, jobs=None,
+                       progressive=False, output_format='jpeg', verbose=True):
     """
     批量压缩目录中的所有图片
     
@@ -73,6 +217,10 @@ def compress_directory(directory, quality=85, optimize=True, backup=True, output
         optimize: 是否优化压缩
         backup: 是否备份原文件
         output_dir: 输出目录（如果为None，则覆盖原文件）
+        jobs: 并行压缩的进程数（默认为CPU核心数减1）
+        progressive: 是否使用渐进式JPEG编码
+        output_format: 输出格式，'jpeg' 或 'webp'（webp 输出为同名的 .webp 文件）
+        verbose: 是否逐张打印压缩结果（失败信息和最终统计总是打印）
     """
     directory = Path(directory)
     if not directory.exists():
@@ -80,18 +228,31 @@ def compress_directory(directory, quality=85, optimize=True, backup=True, output
         return
     
     # 支持的图片格式
-    image_extensions = {'.jpg', '.jpeg', '.png', '.bmp', '.gif', '.JPG', '.JPEG', '.PNG', '.BMP', '.GIF'}
+    image_extensions = {'.jpg', '.jpeg', '.png', '.bmp', '.gif'}
     
-    # 获取所有图片文件
-    image_files = [f for f in directory.iterdir() if f.suffix in image_extensions and f.is_file()]
+    # 获取所有图片文件及其大小（scandir 的目录项自带文件类型，Windows上还自带文件大小）
+    image_sizes = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if os.path.splitext(entry.name)[1].lower() in image_extensions and entry.is_file():
+                image_sizes[Path(entry.path)] = entry.stat().st_size
+    image_files = list(image_sizes)
     
     if not image_files:
         print(f"在目录 {directory} 中未找到图片文件")
         return
     
     print(f"找到 {len(image_files)} 张图片")
+    print(f"输出格式: {output_format.upper()}")
     print(f"压缩质量: {quality}")
     print(f"优化压缩: {optimize}")
+    if progressive:
+        print(f"渐进式编码: 是（超过 {PROGRESSIVE_OPTIMIZE_MAX_PIXELS // 1_000_000} 百万像素的图片不做优化压缩）")
+    if jobs is None:
+        jobs = default_jobs()
+    print(f"并行进程: {jobs}")
+    if not has_libjpeg_turbo():
+        print("提示：当前Pillow未使用 libjpeg-turbo，JPEG编码会明显变慢（安装方法见 README）")
     print("-" * 60)
     
     # 创建备份目录
@@ -112,24 +273,64 @@ def compress_directory(directory, quality=85, optimize=True, backup=True, output
     success_count = 0
     failed_count = 0
     
-    for img_file in image_files:
-        try:
-            # 备份原文件
-            if backup and backup_dir:
-                backup_file = backup_dir / img_file.name
-                import shutil
-                shutil.copy2(img_file, backup_file)
-            
-            # 确定输出路径
-            if output_dir:
-                output_file = Path(output_dir) / img_file.name
-            else:
-                output_file = img_file
-            
-            # 压缩图片
-            result = compress_image(img_file, output_file, quality, optimize)
-            
-            if result['success']:
+    # 备份（I/O）在线程中提前进行，与压缩（CPU）重叠；
+    # 每张图片等自己的备份完成后才开始压缩，备份失败的图片不压缩，避免覆盖唯一的原文件
+    io_pool = ThreadPoolExecutor(max_workers=2) if backup and backup_dir else None
+    # 每张图片的压缩互不依赖，交给多个进程并行执行；只有一个进程时直接在当前进程执行
+    executor = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 and len(image_files) > 1 else None
+    backups = deque()
+    results = []
+    # 已使用的输出文件：转为WebP时 x.png 和 x.jpg 都会输出为 x.webp，后一个不能覆盖前一个
+    output_files = set()
+    try:
+        if io_pool is not None:
+            for img_file in image_files[:BACKUP_AHEAD]:
+                backups.append(io_pool.submit(shutil.copy2, img_file, backup_dir / img_file.name))
+        
+        for i, img_file in enumerate(image_files):
+            try:
+                # 等待当前图片的备份完成，并提前开始后面图片的备份
+                if io_pool is not None:
+                    backup_future = backups.popleft()
+                    ahead = i + BACKUP_AHEAD
+                    if ahead < len(image_files):
+                        next_file = image_files[ahead]
+                        backups.append(io_pool.submit(shutil.copy2, next_file, backup_dir / next_file.name))
+                    backup_future.result()
+                
+                # 确定输出路径
+                if output_dir:
+                    output_file = Path(output_dir) / img_file.name
+                else:
+                    output_file = img_file
+                if output_format == 'webp':
+                    output_file = output_file.with_suffix('.webp')
+                    output_key = os.path.normcase(str(output_file)).lower()
+                    if output_key in output_files:
+                        failed_count += 1
+                        print(f"✗ {img_file.name}: 输出文件 {output_file.name} 与其它图片重名，已跳过")
+                        continue
+                    output_files.add(output_key)
+                
+                task = (img_file, output_file, quality, optimize, image_sizes[img_file], progressive, output_format)
+                if executor is not None:
+                    results.append((img_file, executor.submit(_compress_one, task)))
+                else:
+                    results.append((img_file, _compress_one(task)))
+            except Exception as e:
+                failed_count += 1
+                print(f"✗ {img_file.name}: {str(e)}")
+        
+        for img_file, result in results:
+            if executor is not None:
+                result = result.result()
+            if result.get('skipped'):
+                total_original += result['original_size']
+                total_compressed += result['compressed_size']
+                success_count += 1
+                if verbose:
+                    print(f"- {img_file.name}: 已经足够小，跳过重新编码")
+            elif result['success']:
                 original_size = result['original_size']
                 compressed_size = result['compressed_size']
                 reduction = result['reduction']
@@ -138,23 +339,18 @@ def compress_directory(directory, quality=85, optimize=True, backup=True, output
                 total_compressed += compressed_size
                 success_count += 1
                 
-                # 格式化文件大小
-                def format_size(size):
-                    for unit in ['B', 'KB', 'MB']:
-                        if size < 1024.0:
-                            return f"{size:.2f} {unit}"
-                        size /= 1024.0
-                    return f"{size:.2f} GB"
-                
-                print(f"✓ {img_file.name}")
-                print(f"  原始: {format_size(original_size)} → 压缩后: {format_size(compressed_size)}")
-                print(f"  减少: {reduction:.1f}%")
+                if verbose:
+                    print(f"✓ {img_file.name}")
+                    print(f"  原始: {format_size(original_size)} → 压缩后: {format_size(compressed_size)}")
+                    print(f"  减少: {reduction:.1f}%")
             else:
                 failed_count += 1
                 print(f"✗ {img_file.name}: {result.get('error', '未知错误')}")
-        except Exception as e:
-            failed_count += 1
-            print(f"✗ {img_file.name}: {str(e)}")
+    finally:
+        if io_pool is not None:
+            io_pool.shutdown()
+        if executor is not None:
+            executor.shutdown()
     
     # 打印统计信息
     print("-" * 60)
@@ -163,12 +359,6 @@ def compress_directory(directory, quality=85, optimize=True, backup=True, output
     print(f"失败: {failed_count} 张")
     if success_count > 0:
         total_reduction = (1 - total_compressed / total_original) * 100
-        def format_size(size):
-            for unit in ['B', 'KB', 'MB']:
-                if size < 1024.0:
-                    return f"{size:.2f} {unit}"
-                size /= 1024.0
-            return f"{size:.2f} GB"
         print(f"总大小: {format_size(total_original)} → {format_size(total_compressed)}")
         print(f"总减少: {total_reduction:.1f}%")
 
@@ -177,13 +367,21 @@ def main():
     parser = argparse.ArgumentParser(description='批量压缩图片，保持分辨率不变')
     parser.add_argument('directory', help='图片目录路径（例如: assets/fruits 或 assets/vegetables）')
     parser.add_argument('-q', '--quality', type=int, default=85, 
-                       help='JPEG质量 (1-100，默认85，数值越小文件越小)')
+                       help='JPEG/WebP质量 (1-100，默认85，数值越小文件越小)')
     parser.add_argument('--no-optimize', action='store_true',
                        help='禁用优化压缩')
     parser.add_argument('--no-backup', action='store_true',
                        help='不备份原文件（如果指定了输出目录，则自动不备份）')
     parser.add_argument('-o', '--output', 
                        help='输出目录（如果指定，压缩后的图片将保存到此目录，原文件不变）')
+    parser.add_argument('-j', '--jobs', type=int, default=default_jobs(),
+                       help=f'并行压缩的进程数（默认{default_jobs()}，即CPU核心数减1）')
+    parser.add_argument('--progressive', action='store_true',
+                       help='使用渐进式JPEG编码（通常体积更小；超过400万像素的图片不做优化压缩以节省时间）')
+    parser.add_argument('--format', choices=['jpeg', 'webp'], default='jpeg',
+                       help='输出格式（默认jpeg；webp 保留透明通道，输出为同名的 .webp 文件，原文件保留）')
+    parser.add_argument('--quiet', action='store_true',
+                       help='不逐张打印压缩结果，只打印失败信息和最终统计')
     
     args = parser.parse_args()
     
@@ -195,7 +393,11 @@ def main():
         quality=args.quality,
         optimize=not args.no_optimize,
         backup=backup,
-        output_dir=args.output
+        output_dir=args.output,
+        jobs=max(1, args.jobs),
+        progressive=args.progressive,
+        output_format=args.format,
+        verbose=not args.quiet
     )
 
 
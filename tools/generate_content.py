@@ -5,26 +5,59 @@ AI内容生成工具
 根据输入的水果/物品名字列表，自动生成描述、图片、音频和JSON文件
 """
 
+import asyncio
+import io
 import json
+import mmap
 import os
+import re
+import shutil
 import sys
 import argparse
-import time
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 
 try:
-    from openai import OpenAI
+    from openai import AsyncOpenAI
     import edge_tts
     from pydub import AudioSegment
     from pydub.effects import normalize
     import requests
-    from PIL import Image
+    from requests.adapters import HTTPAdapter
+    from PIL import Image, ImageOps
+    import orjson
 except ImportError as e:
     print(f"错误：缺少必要的依赖包。请运行: pip install -r requirements.txt")
     print(f"缺失的包: {e}")
     sys.exit(1)
 
+# 可选依赖：安装了 pyahocorasick 时用 Aho-Corasick 自动机匹配关键词，否则使用正则表达式
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+# 判断物品类型的关键词：常见的水果和蔬菜
+FRUIT_KEYWORDS = ("果", "莓", "瓜", "桃", "梨", "橘", "橙", "柚", "柑", "李", "杏", "枣", "榴", "芒", "荔", "龙眼", "枇杷")
+VEGETABLE_KEYWORDS = ("菜", "萝卜", "白菜", "菠菜", "芹菜", "韭菜", "葱", "蒜", "姜", "椒", "茄", "豆", "瓜", "薯", "芋", "莲藕")
+FRUIT_VEGETABLE_KEYWORDS = tuple(dict.fromkeys(FRUIT_KEYWORDS + VEGETABLE_KEYWORDS))
+
+
+def _build_keyword_matcher(keywords):
+    """预先编译关键词匹配器，返回 name -> bool 的函数（一次扫描完成匹配）"""
+    if ahocorasick is not None:
+        automaton = ahocorasick.Automaton()
+        for keyword in keywords:
+            automaton.add_word(keyword, keyword)
+        automaton.make_automaton()
+        return lambda name: next(automaton.iter(name), None) is not None
+    pattern = re.compile("|".join(map(re.escape, keywords)))
+    return lambda name: pattern.search(name) is not None
+
+
+is_fruit_or_vegetable = _build_keyword_matcher(FRUIT_VEGETABLE_KEYWORDS)
+
 
 class ContentGenerator:
     """内容生成器主类"""
@@ -32,7 +65,11 @@ class ContentGenerator:
     def __init__(self, config_path: str = "tools/config.json"):
         """初始化生成器"""
         self.config = self._load_config(config_path)
-        self.client = OpenAI(api_key=self.config.get("openai_api_key"))
+        # OpenAI客户端绑定在事件循环上，每次运行 generate_async 时创建，结束时关闭（并发输出的进度行都带物品名字）
+        self.client: Optional[AsyncOpenAI] = None
+        # 图片下载共用一个带连接池的会话，避免每张图片都重新建立TCP+TLS连接
+        self.http = requests.Session()
+        self.http.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=16))
         self.base_dir = Path(__file__).parent.parent
         self.data_dir = self.base_dir / "data"
         self.assets_dir = self.base_dir / "assets" / "fruits"
@@ -40,6 +77,30 @@ class ContentGenerator:
         # 确保目录存在
         self.assets_dir.mkdir(parents=True, exist_ok=True)
         self.data_dir.mkdir(parents=True, exist_ok=True)
+        
+        # OpenAI结果的磁盘缓存：英文名按中文名缓存，描述按 "模型:名字" 缓存
+        self.cache_dir = Path(__file__).parent / ".cache"
+        self._name_cache = self._load_cache("name_map.json")
+        self._description_cache = self._load_cache("descriptions.json")
+    
+    def _load_cache(self, cache_file: str) -> Dict[str, str]:
+        """加载磁盘缓存（不存在或损坏时返回空字典）"""
+        cache_path = self.cache_dir / cache_file
+        try:
+            return orjson.loads(cache_path.read_bytes())
+        except (OSError, orjson.JSONDecodeError):
+            return {}
+    
+    def _save_cache(self, cache_file: str, cache: Dict[str, str]):
+        """保存磁盘缓存（先写临时文件再替换，中断时不会留下损坏的缓存）"""
+        cache_path = self.cache_dir / cache_file
+        tmp_path = cache_path.with_suffix(".tmp")
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_bytes(orjson.dumps(cache, option=orjson.OPT_INDENT_2))
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"  警告：保存缓存失败 - {e}")
     
     def _load_config(self, config_path: str) -> Dict:
         """加载配置文件"""
@@ -59,11 +120,10 @@ class ContentGenerator:
             return 0
         
         try:
-            with open(json_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                if not data:
-                    return 0
-                return max(item.get("id", 0) for item in data)
+            data = self._read_json(json_path)
+            if not data:
+                return 0
+            return max(item.get("id", 0) for item in data)
         except Exception as e:
             print(f"警告：读取现有JSON文件失败: {e}")
             return 0
@@ -75,24 +135,34 @@ class ContentGenerator:
             return []
         
         try:
-            with open(json_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return self._read_json(json_path)
         except Exception as e:
             print(f"警告：读取现有JSON文件失败: {e}")
             return []
     
+    def _read_json(self, json_path: Path):
+        """通过内存映射读取JSON文件（由系统按需分页读入，不经过文件读缓冲）"""
+        with open(json_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # orjson 可以直接解析内存映射，不需要先复制为 bytes
+            with memoryview(mm) as view:
+                return orjson.loads(view)
+    
     def save_json(self, data: List[Dict], json_file: str = "fruits.json"):
         """保存JSON数据"""
         json_path = self.data_dir / json_file
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        json_path.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
     
-    def generate_description(self, name: str) -> Optional[str]:
-        """使用OpenAI生成描述"""
+    async def generate_description(self, name: str) -> Optional[str]:
+        """使用OpenAI生成描述（结果缓存到磁盘）"""
+        model = self.config.get("openai_model", "gpt-4")
+        cache_key = f"{model}:{name}"
+        if cache_key in self._description_cache:
+            return self._description_cache[cache_key]
+        
         try:
             prompt = f"请为{name}生成一段适合儿童学习的简短描述，50-100字，要求语言简单易懂，生动有趣。"
-            response = self.client.chat.completions.create(
-                model=self.config.get("openai_model", "gpt-4"),
+            response = await self.client.chat.completions.create(
+                model=model,
                 messages=[
                     {"role": "system", "content": "你是一个专业的儿童教育内容创作者。"},
                     {"role": "user", "content": prompt}
@@ -100,16 +170,24 @@ class ContentGenerator:
                 temperature=0.7,
                 max_tokens=200
             )
-            return response.choices[0].message.content.strip()
+            description = response.choices[0].message.content.strip()
         except Exception as e:
-            print(f"  错误：生成描述失败 - {e}")
+            print(f"  [{name}] 错误：生成描述失败 - {e}")
             return None
+        
+        if description:
+            self._description_cache[cache_key] = description
+            self._save_cache("descriptions.json", self._description_cache)
+        return description
     
-    def get_english_name(self, chinese_name: str) -> Optional[str]:
-        """获取英文名字"""
+    async def get_english_name(self, chinese_name: str) -> Optional[str]:
+        """获取英文名字（结果缓存到磁盘）"""
+        if chinese_name in self._name_cache:
+            return self._name_cache[chinese_name]
+        
         try:
             prompt = f"请给出'{chinese_name}'的英文名字，只返回英文单词，不要其他解释。"
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=self.config.get("openai_model", "gpt-4"),
                 messages=[
                     {"role": "system", "content": "你是一个翻译助手，只返回英文单词。"},
@@ -121,29 +199,28 @@ class ContentGenerator:
             english_name = response.choices[0].message.content.strip()
             # 清理可能的引号或其他符号
             english_name = english_name.strip('"').strip("'").strip()
-            return english_name
         except Exception as e:
-            print(f"  错误：获取英文名字失败 - {e}")
+            print(f"  [{chinese_name}] 错误：获取英文名字失败 - {e}")
             return None
+        
+        if english_name:
+            self._name_cache[chinese_name] = english_name
+            self._save_cache("name_map.json", self._name_cache)
+        return english_name
     
-    def generate_image(self, name: str, item_id: int) -> Optional[str]:
+    async def generate_image(self, name: str, item_id: int) -> Optional[str]:
         """生成图片"""
         try:
             # 判断物品类型，生成环境提示词
             # 简单判断：常见的水果和蔬菜关键词
-            fruits_keywords = ["果", "莓", "瓜", "桃", "梨", "橘", "橙", "柚", "柑", "李", "杏", "枣", "榴", "芒", "荔", "龙眼", "枇杷"]
-            vegetables_keywords = ["菜", "萝卜", "白菜", "菠菜", "芹菜", "韭菜", "葱", "蒜", "姜", "椒", "茄", "豆", "瓜", "薯", "芋", "莲藕"]
-            
-            is_fruit_or_vegetable = any(keyword in name for keyword in fruits_keywords + vegetables_keywords)
-            
-            if is_fruit_or_vegetable:
+            if is_fruit_or_vegetable(name):
                 prompt = f"一个清晰的{name}图片，显示在它的自然生长环境中（如树上、田间、菜园等），适合儿童识物卡片，真实场景，高质量摄影"
             else:
                 prompt = f"一个清晰的{name}图片，显示在实际使用场景中，适合儿童识物卡片，真实场景，高质量摄影"
             
-            print(f"  生成图片提示词: {prompt}")
+            print(f"  [{name}] 生成图片提示词: {prompt}")
             
-            response = self.client.images.generate(
+            response = await self.client.images.generate(
                 model=self.config.get("image_model", "dall-e-3"),
                 prompt=prompt,
                 size=self.config.get("image_size", "1024x1024"),
@@ -154,126 +231,121 @@ class ContentGenerator:
             image_url = response.data[0].url
             image_path = self.assets_dir / f"{item_id}.jpg"
             
-            # 下载图片
-            img_response = requests.get(image_url)
-            img_response.raise_for_status()
-            
-            # 保存图片
-            with open(image_path, 'wb') as f:
-                f.write(img_response.content)
-            
-            # 确保是1:1比例，使用PIL处理
-            img = Image.open(image_path)
-            # 如果是正方形，直接保存；如果不是，裁剪为正方形
-            width, height = img.size
-            if width != height:
-                size = min(width, height)
-                left = (width - size) // 2
-                top = (height - size) // 2
-                img = img.crop((left, top, left + size, top + size))
-                img = img.resize((1024, 1024), Image.Resampling.LANCZOS)
-            
-            img.save(image_path, "JPEG", quality=95)
+            # 下载和处理图片是阻塞操作，放到线程中执行，不影响其它物品的请求
+            await asyncio.to_thread(self._download_image, image_url, image_path)
             
             return f"assets/fruits/{item_id}.jpg"
         except Exception as e:
-            print(f"  错误：生成图片失败 - {e}")
+            print(f"  [{name}] 错误：生成图片失败 - {e}")
             return None
     
-    def generate_audio(self, chinese_name: str, english_name: str, item_id: int) -> Optional[str]:
+    def _download_image(self, image_url: str, image_path: Path):
+        """下载图片并裁剪为1:1比例"""
+        # 下载图片，边下载边写入文件，不在内存中缓存整张图片
+        with self.http.get(image_url, stream=True) as img_response:
+            img_response.raise_for_status()
+            img_response.raw.decode_content = True
+            with open(image_path, 'wb') as f:
+                shutil.copyfileobj(img_response.raw, f)
+        
+        # 确保是1:1比例，使用PIL处理
+        img = Image.open(image_path)
+        # 已经是1024x1024的JPEG，不需要解码和重新编码
+        if img.format == "JPEG" and img.size == (1024, 1024):
+            img.close()
+            return
+        # 如果是正方形，直接保存；如果不是，裁剪为正方形
+        width, height = img.size
+        if width != height:
+            # 反正要缩小到1024，JPEG 可以在解码时直接按 1/2、1/4、1/8 缩小（保证短边不小于1024）
+            img.draft("RGB", (1024, 1024))
+            # 居中裁剪和缩放合并为一次操作，不生成中间图片
+            img = ImageOps.fit(img, (1024, 1024), Image.Resampling.LANCZOS)
+        
+        img.save(image_path, "JPEG", quality=95)
+    
+    async def generate_audio(self, chinese_name: str, english_name: str, item_id: int) -> Optional[str]:
         """生成中英文双语音频"""
         try:
-            # 生成1秒静音
-            silence = AudioSegment.silent(duration=1000)  # 1000毫秒 = 1秒
-            
-            # 生成中文语音
-            print(f"  生成中文语音: {chinese_name}")
-            chinese_audio = self._tts_to_audio(chinese_name, "zh-CN-XiaoxiaoNeural")
-            
-            # 生成英文语音
-            print(f"  生成英文语音: {english_name}")
-            english_audio = self._tts_to_audio(english_name, "en-US-AriaNeural")
-            
-            # 合成音频：中文 -> 1秒静音 -> 英文 -> 1秒静音 -> 中文 -> 1秒静音 -> 英文
-            combined = chinese_audio + silence + english_audio + silence + chinese_audio + silence + english_audio
-            
-            # 标准化音量
-            combined = normalize(combined)
+            # 同时生成中文和英文语音
+            print(f"  [{chinese_name}] 生成中文语音: {chinese_name}")
+            print(f"  [{chinese_name}] 生成英文语音: {english_name}")
+            chinese_audio, english_audio = await self._tts_to_audios(
+                (chinese_name, "zh-CN-XiaoxiaoNeural"),
+                (english_name, "en-US-AriaNeural")
+            )
             
-            # 保存为MP3
+            # 合成和编码音频是阻塞操作，放到线程中执行
             audio_path = self.assets_dir / f"{item_id}.mp3"
-            combined.export(str(audio_path), format="mp3", bitrate="128k")
+            await asyncio.to_thread(self._export_audio, chinese_audio, english_audio, audio_path)
             
             return f"assets/fruits/{item_id}.mp3"
         except Exception as e:
-            print(f"  错误：生成音频失败 - {e}")
+            print(f"  [{chinese_name}] 错误：生成音频失败 - {e}")
             return None
     
-    def _tts_to_audio(self, text: str, voice: str) -> AudioSegment:
-        """使用Edge TTS生成音频并转换为AudioSegment"""
-        import tempfile
-        import asyncio
+    def _export_audio(self, chinese_audio: AudioSegment, english_audio: AudioSegment, audio_path: Path):
+        """合成中英文语音并保存为MP3"""
+        # 生成1秒静音
+        silence = AudioSegment.silent(duration=1000)  # 1000毫秒 = 1秒
         
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as tmp_file:
-            tmp_path = tmp_file.name
+        # 合成音频：中文 -> 1秒静音 -> 英文 -> 1秒静音 -> 中文 -> 1秒静音 -> 英文
+        combined = chinese_audio + silence + english_audio + silence + chinese_audio + silence + english_audio
         
-        try:
-            # 使用edge_tts生成音频（异步）
-            async def generate():
-                communicate = edge_tts.Communicate(text, voice)
-                await communicate.save(tmp_path)
-            
-            # 运行异步函数
-            # 尝试获取现有事件循环，如果没有则创建新的
-            try:
-                loop = asyncio.get_event_loop()
-                if loop.is_closed():
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                loop.run_until_complete(generate())
-            except RuntimeError:
-                # 如果没有事件循环，使用asyncio.run
-                asyncio.run(generate())
-            
-            # 加载为AudioSegment
-            audio = AudioSegment.from_mp3(tmp_path)
-            return audio
-        finally:
-            # 清理临时文件
-            if os.path.exists(tmp_path):
-                os.unlink(tmp_path)
+        # 标准化音量
+        combined = normalize(combined)
+        
+        # 保存为MP3
+        combined.export(str(audio_path), format="mp3", bitrate="128k")
     
-    def process_item(self, name: str, item_id: int, existing_names: set) -> Optional[Dict]:
+    async def _tts_to_audios(self, *texts_and_voices: Tuple[str, str]) -> List[AudioSegment]:
+        """使用Edge TTS并发生成多段语音，按顺序返回AudioSegment（音频数据只在内存中传递）"""
+        async def synthesize(text: str, voice: str) -> bytes:
+            buffer = io.BytesIO()
+            async for chunk in edge_tts.Communicate(text, voice).stream():
+                if chunk["type"] == "audio":
+                    buffer.write(chunk["data"])
+            return buffer.getvalue()
+        
+        # 所有语音请求并发执行
+        audio_data = await asyncio.gather(*(synthesize(text, voice) for text, voice in texts_and_voices))
+        
+        # 加载为AudioSegment（通过ffmpeg解码，放到线程中执行）
+        return await asyncio.to_thread(
+            lambda: [AudioSegment.from_file(io.BytesIO(data), format="mp3") for data in audio_data]
+        )
+    
+    async def process_item(self, name: str, item_id: int, existing_names: set) -> Optional[Dict]:
         """处理单个物品"""
         print(f"\n处理: {name} (ID: {item_id})")
         
         # 检查是否已存在
         if name in existing_names:
-            print(f"  跳过：{name} 已存在")
+            print(f"  [{name}] 跳过：已存在")
             return None
         
         # 生成描述
-        print(f"  生成描述...")
-        description = self.generate_description(name)
+        print(f"  [{name}] 生成描述...")
+        description = await self.generate_description(name)
         if not description:
             return None
         
         # 获取英文名字
-        print(f"  获取英文名字...")
-        english_name = self.get_english_name(name)
+        print(f"  [{name}] 获取英文名字...")
+        english_name = await self.get_english_name(name)
         if not english_name:
             return None
-        print(f"  英文名字: {english_name}")
+        print(f"  [{name}] 英文名字: {english_name}")
         
         # 生成图片
-        print(f"  生成图片...")
-        image_path = self.generate_image(name, item_id)
+        print(f"  [{name}] 生成图片...")
+        image_path = await self.generate_image(name, item_id)
         if not image_path:
             return None
         
         # 生成音频
-        print(f"  生成音频...")
-        audio_path = self.generate_audio(name, english_name, item_id)
+        print(f"  [{name}] 生成音频...")
+        audio_path = await self.generate_audio(name, english_name, item_id)
         if not audio_path:
             # 如果音频生成失败，删除已生成的图片
             img_file = self.assets_dir / f"{item_id}.jpg"
@@ -291,6 +363,10 @@ class ContentGenerator:
     
     def generate(self, names: List[str], json_file: str = "fruits.json", append: bool = False):
         """生成内容"""
+        return asyncio.run(self.generate_async(names, json_file, append))
+    
+    async def generate_async(self, names: List[str], json_file: str = "fruits.json", append: bool = False):
+        """生成内容（多个物品并发处理，并发数由配置 concurrency 控制）"""
         # 加载现有数据
         existing_data = self.load_existing_data(json_file) if append else []
         existing_names = {item["name"] for item in existing_data}
@@ -298,29 +374,42 @@ class ContentGenerator:
         # 获取起始ID
         start_id = self.get_max_id(json_file) + 1 if append else 1
         
-        # 处理每个物品
+        # 已存在或重复的名字直接跳过，其余物品按顺序预先分配ID
         new_items = []
         failed_items = []
+        pending = []
+        for name in names:
+            if name in existing_names:
+                print(f"\n跳过：{name} 已存在")
+                failed_items.append(name)
+                continue
+            existing_names.add(name)
+            pending.append((name, start_id + len(pending)))
         
-        for i, name in enumerate(names, start=1):
-            item_id = start_id + len(new_items)
-            
-            try:
-                item = self.process_item(name, item_id, existing_names)
-                if item:
-                    new_items.append(item)
-                    existing_names.add(name)
-                    print(f"  ✓ 完成")
-                else:
-                    failed_items.append(name)
-                    print(f"  ✗ 失败")
-            except Exception as e:
-                print(f"  ✗ 处理失败: {e}")
+        # 用信号量限制同时处理的物品数，避免API限流
+        semaphore = asyncio.Semaphore(max(1, self.config.get("concurrency", 4)))
+        
+        async def bounded(name: str, item_id: int) -> Optional[Dict]:
+            async with semaphore:
+                try:
+                    item = await self.process_item(name, item_id, set())
+                except Exception as e:
+                    print(f"  ✗ {name} 处理失败: {e}")
+                    return None
+                print(f"  {'✓' if item else '✗'} {name} {'完成' if item else '失败'}")
+                return item
+        
+        async with AsyncOpenAI(api_key=self.config.get("openai_api_key")) as self.client:
+            results = await asyncio.gather(*(bounded(name, item_id) for name, item_id in pending))
+        
+        for (name, _), item in zip(pending, results):
+            if item:
+                new_items.append(item)
+            else:
                 failed_items.append(name)
-            
-            # 添加延迟避免API限流
-            if i < len(names):
-                time.sleep(2)
+        
+        # 失败的物品会留下ID空缺，按顺序重新编号
+        self._renumber_items(new_items, start_id)
         
         # 合并数据
         if append:
@@ -338,6 +427,18 @@ class ContentGenerator:
             print(f"\n✗ 以下项目生成失败: {', '.join(failed_items)}")
         
         return len(new_items), len(failed_items)
+    
+    def _renumber_items(self, items: List[Dict], start_id: int):
+        """把物品ID重新编号为从 start_id 开始的连续数字，并重命名对应的图片和音频文件"""
+        for new_id, item in enumerate(items, start=start_id):
+            old_id = item["id"]
+            if old_id == new_id:
+                continue
+            # 新ID总是小于旧ID，且按顺序处理，不会覆盖尚未移动的文件
+            for suffix, key in ((".jpg", "image"), (".mp3", "audio")):
+                os.replace(self.assets_dir / f"{old_id}{suffix}", self.assets_dir / f"{new_id}{suffix}")
+                item[key] = f"assets/fruits/{new_id}{suffix}"
+            item["id"] = new_id
 
 
 def main():
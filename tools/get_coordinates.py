@@ -17,6 +17,12 @@ except ImportError:
     print("请运行: pip install pyautogui")
     sys.exit(1)
 
+# 可选依赖：安装了 keyboard 时注册全局热键，窗口没有焦点也能获取坐标
+try:
+    import keyboard
+except ImportError:
+    keyboard = None
+
 
 class CoordinateGetter:
     """坐标获取器"""
@@ -29,6 +35,11 @@ class CoordinateGetter:
         
         self.coordinates = []
         self.is_capturing = False
+        self._hotkeys = []
+        
+        # 全局热键在 keyboard 的线程中触发，通过虚拟事件交给 tkinter 主线程处理
+        self.root.bind('<<CaptureCoordinate>>', self.capture_coordinate)
+        self.root.bind('<<StopCapture>>', self.stop_capture)
         
         self.create_widgets()
         self.start_capture()
@@ -90,16 +101,43 @@ class CoordinateGetter:
     def start_capture(self):
         """开始捕获坐标"""
         self.is_capturing = True
-        self.root.bind('<F2>', self.capture_coordinate)
-        self.root.bind('<Escape>', self.stop_capture)
-        self.root.focus_set()
-        print("坐标捕获已启动，按 F1 获取坐标，按 ESC 停止")
+        if keyboard is not None and self._register_hotkeys():
+            print("坐标捕获已启动（全局热键），按 F2 获取坐标，按 ESC 停止")
+        else:
+            self.root.bind('<F2>', self.capture_coordinate)
+            self.root.bind('<Escape>', self.stop_capture)
+            self.root.focus_set()
+            print("坐标捕获已启动，按 F2 获取坐标，按 ESC 停止")
+            if keyboard is None:
+                print("提示：安装 keyboard 库（pip install keyboard）后无需切回本窗口即可获取坐标")
+    
+    def _register_hotkeys(self):
+        """注册全局热键，失败时（Linux 需要 root 权限，macOS 需要辅助功能权限）返回 False"""
+        try:
+            self._hotkeys.append(
+                keyboard.add_hotkey('f2', lambda: self.root.event_generate('<<CaptureCoordinate>>', when='tail')))
+            self._hotkeys.append(
+                keyboard.add_hotkey('esc', lambda: self.root.event_generate('<<StopCapture>>', when='tail')))
+            return True
+        except (ImportError, OSError) as e:
+            for hotkey in self._hotkeys:
+                keyboard.remove_hotkey(hotkey)
+            self._hotkeys = []
+            print(f"提示：无法注册全局热键（{e}），只在本窗口有焦点时响应按键")
+            return False
     
     def stop_capture(self, event=None):
         """停止捕获"""
+        if not self.is_capturing:
+            return
         self.is_capturing = False
-        self.root.unbind('<F2>')
-        self.root.unbind('<Escape>')
+        if self._hotkeys:
+            for hotkey in self._hotkeys:
+                keyboard.remove_hotkey(hotkey)
+            self._hotkeys = []
+        else:
+            self.root.unbind('<F2>')
+            self.root.unbind('<Escape>')
         messagebox.showinfo("提示", "坐标捕获已停止")
     
     def capture_coordinate(self, event=None):
@@ -5,10 +5,18 @@
 可视化界面，可以读取JSON文件，查看项目信息，并从剪切板替换图片
 """
 
+import hashlib
+import io
 import json
+import logging
+import multiprocessing
 import os
+import queue
 import sys
 import tkinter as tk
+import tkinter.font as tkfont
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import ttk, messagebox, filedialog
 from pathlib import Path
 from typing import List, Dict, Optional
@@ -32,10 +40,107 @@ except ImportError as e:
     MP3BatchGenerator = None
     print(f"警告：无法导入MP3生成模块: {e}")
 
+# 可选依赖：安装了 ijson 时流式解析很大的JSON文件，降低内存占用
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# 可选依赖：安装了 orjson 时用它读写JSON文件，比标准库快数倍
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# 可选依赖：macOS上安装了 pyobjc 时直接从 NSPasteboard 读取剪切板图片，
+# 不需要像 ImageGrab 那样启动 osascript 子进程再解码十六进制文本
+NSPasteboard = None
+if sys.platform == "darwin":
+    try:
+        from AppKit import NSPasteboard, NSPasteboardTypePNG, NSPasteboardTypeTIFF
+    except ImportError:
+        pass
+
+
+def _grab_clipboard():
+    """读取剪切板内容（返回 Image 对象、文件路径列表或 None）"""
+    if NSPasteboard is not None:
+        pasteboard = NSPasteboard.generalPasteboard()
+        for data_type in (NSPasteboardTypePNG, NSPasteboardTypeTIFF):
+            data = pasteboard.dataForType_(data_type)
+            if data is not None:
+                return Image.open(io.BytesIO(bytes(data)))
+        return None
+    return ImageGrab.grabclipboard()
+
+
+def _loads(data: bytes):
+    """解析JSON字节串"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _dumps(obj) -> bytes:
+    """序列化为2空格缩进的UTF-8 JSON字节串（两种实现的输出相同）"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, indent=2).encode('utf-8')
+
+
+class _QueueLogHandler(logging.Handler):
+    """把日志消息放入 multiprocessing 队列，由界面进程显示"""
+    
+    def __init__(self, message_queue):
+        super().__init__()
+        self.message_queue = message_queue
+    
+    def emit(self, record):
+        try:
+            self.message_queue.put(("log", self.format(record)))
+        except Exception:
+            self.handleError(record)
+
+
+def _batch_worker_entry(config_path: str, json_filename: str, message_queue, stop_event):
+    """批量生成MP3的子进程入口（模块级函数，spawn 方式启动时可以被 pickle）"""
+    if MP3BatchGenerator is None:
+        message_queue.put(("error", "无法导入MP3生成模块，请检查依赖是否已安装"))
+        return
+    
+    # 生成器的日志不再输出到控制台，而是发送给界面进程
+    logging.getLogger("mp3batch").handlers[:] = [_QueueLogHandler(message_queue)]
+    
+    try:
+        generator = MP3BatchGenerator(config_path, stop_event=stop_event)
+        result = generator.batch_generate(json_filename, 0, None)
+        message_queue.put(("done", result))
+    except Exception as e:
+        import traceback
+        message_queue.put(("log", traceback.format_exc()))
+        message_queue.put(("error", str(e)))
+
 
 class ImageReplacerApp:
     """图片替换工具主应用"""
     
+    # assets路径的特殊情况（JSON文件名 -> assets路径）：music.json 使用 assets/mp3/
+    _ASSETS_MAP = {"music": "assets/mp3"}
+    # 按操作系统选定的字体，所有窗口共用
+    _FONTS: Optional[Dict[str, tuple]] = None
+    # 预览区域的边长（像素）
+    PREVIEW_SIZE = 300
+    # 预览图缓存的最大数量
+    PREVIEW_CACHE_SIZE = 64
+    # 编辑字段后自动保存JSON文件的延迟（毫秒）
+    AUTOSAVE_DELAY_MS = 2000
+    # 连续输入时刷新列表显示的延迟（毫秒）
+    FIELD_CHANGE_DELAY_MS = 150
+    # 替换图片时的JPEG保存参数：渐进式编码并优化哈夫曼表，网页加载更快、文件更小
+    JPEG_SAVE_OPTIONS = {"quality": 82, "optimize": True, "progressive": True, "subsampling": "4:2:0"}
+    # 超过这个大小的JSON文件使用 ijson 流式解析
+    LARGE_JSON_BYTES = 25 * 1024 * 1024
+    
     def __init__(self, root):
         self.root = root
         self.root.title("图片替换工具")
@@ -45,55 +150,84 @@ class ImageReplacerApp:
         self.data_dir = self.base_dir / "data"
         self.json_file = self.data_dir / "fruits.json"
         self.data: List[Dict] = []
+        # 每个项目在列表中显示的文字（与 self.data 一一对应，加载或编辑时更新）
+        self._display_texts: List[str] = []
+        # 列表框中当前显示的文字，用于只更新有变化的部分
+        self._list_shadow: List[str] = []
         self.current_item: Optional[Dict] = None
         self.current_index: Optional[int] = None
         
+        # 预览图缓存：(图片路径, 修改时间) -> 缩放好的图片，按最近使用顺序排列
+        self._preview_cache = OrderedDict()
+        # 预览图在单个后台线程中解码，令牌用于丢弃过期的加载结果
+        self._preview_pool = ThreadPoolExecutor(max_workers=1)
+        self._preview_token = 0
+        # 当前显示（或正在加载）的预览图，与缓存使用相同的键
+        self._preview_image_key = None
+        
+        # 修改先保存在内存中，延迟写入JSON文件
+        self._dirty = False
+        self._autosave_job = None
+        # 最近一次读取或写入的JSON文件内容的哈希，内容没有变化时不重写文件
+        self._last_saved_hash = None
+        # 字段修改后延迟刷新列表显示，连续按键只刷新一次
+        self._field_change_job = None
+        
         # 设置中文字体
         self.setup_fonts()
         
         # 创建界面
         self.create_widgets()
         
+        # 所有预览共用一个 PhotoImage，切换项目时只更新像素，不重复创建Tk图片资源
+        self._preview_photo = ImageTk.PhotoImage(Image.new("RGB", (self.PREVIEW_SIZE, self.PREVIEW_SIZE)))
+        background = ttk.Style().lookup("TLabel", "background") or "white"
+        self._preview_background = tuple(c >> 8 for c in self.root.winfo_rgb(background))
+        
         # 加载数据
         self.load_json()
+        
+        # 关闭窗口前把未写入的修改保存到JSON文件
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
     
     def setup_fonts(self):
-        """设置支持中文的字体"""
+        """设置支持中文的字体（只在第一次调用时检测，结果缓存在类上）"""
+        cls = type(self)
+        if cls._FONTS is None:
+            cls._FONTS = cls._resolve_fonts(self.root)
+        for name, font in cls._FONTS.items():
+            setattr(self, name, font)
+    
+    @classmethod
+    def _resolve_fonts(cls, root) -> Dict[str, tuple]:
+        """根据操作系统选择合适的中文字体"""
         import platform
         
-        # 根据操作系统选择合适的中文字体
         system = platform.system()
         if system == "Windows":
             # Windows系统使用微软雅黑
-            self.font_normal = ("Microsoft YaHei", 10)
-            self.font_bold = ("Microsoft YaHei", 12, "bold")
-            self.font_large = ("Microsoft YaHei", 11)
-            self.font_code = ("Consolas", 9)
+            family, code_family = "Microsoft YaHei", "Consolas"
         elif system == "Darwin":  # macOS
             # macOS使用PingFang SC
-            self.font_normal = ("PingFang SC", 10)
-            self.font_bold = ("PingFang SC", 12, "bold")
-            self.font_large = ("PingFang SC", 11)
-            self.font_code = ("Menlo", 9)
+            family, code_family = "PingFang SC", "Menlo"
         else:  # Linux
             # Linux使用文泉驿或系统默认字体
-            self.font_normal = ("WenQuanYi Micro Hei", 10)
-            self.font_bold = ("WenQuanYi Micro Hei", 12, "bold")
-            self.font_large = ("WenQuanYi Micro Hei", 11)
-            self.font_code = ("DejaVu Sans Mono", 9)
+            family, code_family = "WenQuanYi Micro Hei", "DejaVu Sans Mono"
         
         # 如果字体不存在，使用系统默认字体
         try:
             # 测试字体是否可用
-            test_font = tk.Font(font=self.font_normal)
-            test_font.actual()
-        except:
-            # 使用系统默认字体
-            self.font_normal = ("TkDefaultFont", 10)
-            self.font_bold = ("TkDefaultFont", 12, "bold")
-            self.font_large = ("TkDefaultFont", 11)
-            self.font_code = ("TkFixedFont", 9)
-            self.font_code = ("TkFixedFont", 9)
+            if family not in tkfont.families(root):
+                family, code_family = "TkDefaultFont", "TkFixedFont"
+        except tk.TclError:
+            family, code_family = "TkDefaultFont", "TkFixedFont"
+        
+        return {
+            "font_normal": (family, 10),
+            "font_bold": (family, 12, "bold"),
+            "font_large": (family, 11),
+            "font_code": (code_family, 9),
+        }
     
     def create_widgets(self):
         """创建界面组件"""
@@ -227,8 +361,9 @@ class ImageReplacerApp:
     
     def browse_file(self):
         """浏览选择JSON文件"""
-        # 先保存当前项目的修改
-        self.save_current_item(silent=True)
+        # 切换文件前先把当前文件的修改写入磁盘
+        self._sync_current_to_memory()
+        self._autosave()
         
         file_path = filedialog.askopenfilename(
             title="选择JSON文件",
@@ -237,13 +372,13 @@ class ImageReplacerApp:
         )
         if file_path:
             self.file_var.set(file_path)
-            self.json_file = Path(file_path)
             self.load_json()
     
     def load_json(self):
         """加载JSON文件"""
-        # 先保存当前项目的修改
-        self.save_current_item(silent=True)
+        # 重新加载前先把当前文件的修改写入磁盘
+        self._sync_current_to_memory()
+        self._autosave()
         
         json_path = Path(self.file_var.get())
         if not json_path.exists():
@@ -251,12 +386,23 @@ class ImageReplacerApp:
             return
         
         try:
-            with open(json_path, 'r', encoding='utf-8') as f:
-                self.data = json.load(f)
+            if ijson is not None and json_path.stat().st_size > self.LARGE_JSON_BYTES:
+                self.data = self._load_large_json(json_path)
+                self._last_saved_hash = None
+            else:
+                # 一次读入全部字节再解析，比 json.load 分块读取更快
+                with open(json_path, 'rb') as f:
+                    raw = f.read()
+                self.data = _loads(raw)
+                self._last_saved_hash = hashlib.blake2b(raw).digest()
+            self._display_texts = [self._format_display_text(item) for item in self.data]
             
             self.json_file = json_path
+            self._dirty = False
             self.current_item = None
             self.current_index = None
+            # 差量更新会保留未变化的行，同时保留了旧的选中状态，需要手动清除
+            self.listbox.selection_clear(0, tk.END)
             self.update_list()
             self.update_info()
             self.update_image_preview()
@@ -264,37 +410,97 @@ class ImageReplacerApp:
         except Exception as e:
             messagebox.showerror("错误", f"加载JSON文件失败:\n{e}")
     
+    def _load_large_json(self, json_path: Path) -> List[Dict]:
+        """使用 ijson 逐项解析很大的JSON文件，并在标题栏显示进度"""
+        title = self.root.title()
+        data = []
+        try:
+            with open(json_path, 'rb') as f:
+                for item in ijson.items(f, 'item', use_float=True):
+                    data.append(item)
+                    if len(data) % 1000 == 0:
+                        self.root.title(f"{title} - 正在加载 {len(data)} 个项目...")
+                        self.root.update_idletasks()
+        finally:
+            self.root.title(title)
+        return data
+    
+    @staticmethod
+    def _format_display_text(item: Dict) -> str:
+        """项目在列表中显示的文字"""
+        return f"ID {item.get('id', 'N/A')}: {item.get('name', '未知')}"
+    
     def update_list(self):
         """更新列表显示"""
-        self.listbox.delete(0, tk.END)
-        for item in self.data:
-            display_text = f"ID {item.get('id', 'N/A')}: {item.get('name', '未知')}"
-            self.listbox.insert(tk.END, display_text)
+        items = self._display_texts
+        
+        # 与上次显示的内容比较，只替换从第一个不同项开始的部分（添加项目时只需插入一项）
+        shadow = self._list_shadow
+        start = 0
+        for start, (old, new) in enumerate(zip(shadow, items)):
+            if old != new:
+                break
+        else:
+            start = min(len(shadow), len(items))
+        if start < len(shadow):
+            self.listbox.delete(start, tk.END)
+        if start < len(items):
+            # 一次调用插入全部项目，避免每项一次Tcl调用
+            self.listbox.insert(tk.END, *items[start:])
+        self._list_shadow = list(items)
     
     def on_select(self, event):
         """列表项选择事件"""
-        # 先保存当前项目的修改
-        self.save_current_item(silent=True)
-        
         selection = self.listbox.curselection()
+        if selection and selection[0] != self.current_index:
+            # 切换到其它项目前，先刷新当前项目还没更新的列表显示
+            self._flush_field_change()
+        
+        # 先把当前项目的修改保存到内存
+        self._sync_current_to_memory()
+        
         if not selection:
             return
         
         index = selection[0]
+        if index == self.current_index:
+            # 点击的是已经选中的项目
+            return
         self.current_index = index
         self.current_item = self.data[index]
         self.update_info()
         self.update_image_preview()
     
     def on_field_change(self, event=None):
-        """字段修改事件（用于实时更新列表显示）"""
+        """字段修改事件（用于实时更新列表显示，连续输入时只在停顿后刷新一次）"""
+        if self._field_change_job is not None:
+            self.root.after_cancel(self._field_change_job)
+        self._field_change_job = self.root.after(self.FIELD_CHANGE_DELAY_MS, self._refresh_current_entry)
+    
+    def _flush_field_change(self):
+        """立即执行还在等待中的列表显示刷新"""
+        if self._field_change_job is not None:
+            self.root.after_cancel(self._field_change_job)
+            self._refresh_current_entry(reselect=False)
+    
+    def _refresh_current_entry(self, reselect=True):
+        """刷新当前项目在列表中的显示，并把修改保存到内存"""
+        self._field_change_job = None
         if self.current_item and self.current_index is not None:
             # 更新名字显示
             name = self.name_var.get()
             display_text = f"ID {self.current_item.get('id', 'N/A')}: {name or '未知'}"
             self.listbox.delete(self.current_index)
             self.listbox.insert(self.current_index, display_text)
-            self.listbox.selection_set(self.current_index)
+            self._display_texts[self.current_index] = display_text
+            self._list_shadow[self.current_index] = display_text
+            if reselect:
+                self.listbox.selection_set(self.current_index)
+            
+            # 修改先保存到内存，停止输入一段时间后再写入JSON文件
+            self._sync_current_to_memory()
+            if self._dirty:
+                self._schedule_autosave()
     
     def update_info(self):
         """更新详细信息显示"""
@@ -322,37 +528,103 @@ class ImageReplacerApp:
         """根据当前JSON文件名确定assets路径"""
         json_filename = self.json_file.stem  # 获取不带扩展名的文件名
         
-        # 特殊处理：music.json 使用 assets/mp3/
-        if json_filename == "music":
-            return "assets/mp3"
-        
         # 其他图包：直接使用文件名作为assets子目录
-        return f"assets/{json_filename}"
+        return self._ASSETS_MAP.get(json_filename, f"assets/{json_filename}")
     
     def update_image_preview(self):
-        """更新图片预览"""
+        """更新图片预览（解码和缩放在后台线程进行，不阻塞界面）"""
+        key = None
+        if self.current_item and self.current_item.get('image'):
+            image_path = self.base_dir / self.current_item['image']
+            try:
+                key = (str(image_path), image_path.stat().st_mtime_ns)
+            except OSError:
+                pass
+        
+        # 显示的（或正在加载的）已经是这张图片，不需要任何操作
+        if key is not None and key == self._preview_image_key:
+            return
+        self._preview_image_key = key
+        
+        # 每次更新都换一个新令牌，之前还没完成的后台加载结果会被丢弃
+        self._preview_token += 1
+        
         if not self.current_item or not self.current_item.get('image'):
             self.image_label.config(image='', text="无图片")
             return
         
-        image_path = self.base_dir / self.current_item['image']
-        if not image_path.exists():
+        if key is None:
             self.image_label.config(image='', text="图片文件不存在")
             return
         
+        # 已经缓存过的预览图直接显示，不再重新解码和缩放
+        preview = self._preview_cache.get(key)
+        if preview is not None:
+            self._preview_cache.move_to_end(key)
+            self._show_preview(preview)
+            return
+        
+        self.image_label.config(image='', text="加载中...")
+        token = self._preview_token
+        future = self._preview_pool.submit(self._load_preview_image, image_path, self._preview_background)
+        future.add_done_callback(lambda f: self.root.after(0, self._apply_preview, token, key, f))
+    
+    @classmethod
+    def _load_preview_image(cls, image_path: Path, background):
+        """加载并缩放图片以适应预览区域，居中放在背景上（在后台线程中执行）"""
+        # 计算缩放比例，保持宽高比
+        max_size = cls.PREVIEW_SIZE
+        with Image.open(image_path) as src:
+            # JPEG 在解码时直接按 1/2、1/4、1/8 缩小，只解码需要的像素
+            src.draft("RGB", (max_size * 2, max_size * 2))
+            # 复制出解码后的图片，离开 with 时立即关闭文件（Windows上打开的文件不能被替换）
+            img = src.copy()
+        img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+        
+        # 预览 PhotoImage 的尺寸固定，把图片居中贴到同样大小的背景上（透明部分显示背景色）
+        img = img.convert("RGBA")
+        canvas = Image.new("RGB", (max_size, max_size), background)
+        canvas.paste(img, ((max_size - img.width) // 2, (max_size - img.height) // 2), img)
+        return canvas
+    
+    @staticmethod
+    def _open_image_rgb(file_path):
+        """打开图片文件并转换为RGB模式（读取完成后立即关闭文件）"""
+        # 保存的素材需要完整分辨率解码后再缩放，不使用 draft（只有预览图使用 draft）
+        with Image.open(file_path) as src:
+            if src.mode != 'RGB':
+                return src.convert('RGB')
+            return src.copy()
+    
+    def _apply_preview(self, token, key, future):
+        """在界面线程中显示后台加载好的预览图"""
+        if token != self._preview_token:
+            # 用户已经切换到别的项目
+            return
         try:
-            # 加载并缩放图片以适应预览区域
-            img = Image.open(image_path)
-            # 计算缩放比例，保持宽高比
-            max_size = 300
-            img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
-            
-            # 转换为PhotoImage
-            photo = ImageTk.PhotoImage(img)
-            self.image_label.config(image=photo, text='')
-            self.image_label.image = photo  # 保持引用
+            preview = future.result()
         except Exception as e:
+            self._preview_image_key = None
             self.image_label.config(image='', text=f"加载图片失败:\n{e}")
+            return
+        
+        self._preview_cache[key] = preview
+        if len(self._preview_cache) > self.PREVIEW_CACHE_SIZE:
+            self._preview_cache.popitem(last=False)
+        
+        self._show_preview(preview)
+    
+    def _show_preview(self, preview):
+        """把预览图的像素写入共用的 PhotoImage 并显示（必须在界面线程中调用）"""
+        self._preview_photo.paste(preview)
+        self.image_label.config(image=self._preview_photo, text='')
+    
+    def _invalidate_preview(self, image_path: Path):
+        """移除某张图片的预览缓存（图片被替换后调用）"""
+        image_path = str(image_path)
+        for key in [key for key in self._preview_cache if key[0] == image_path]:
+            del self._preview_cache[key]
+        self._preview_image_key = None
     
     def replace_from_clipboard(self):
         """从剪切板替换图片"""
@@ -369,7 +641,7 @@ class ImageReplacerApp:
         
         try:
             # 从剪切板获取图片
-            clipboard_content = ImageGrab.grabclipboard()
+            clipboard_content = _grab_clipboard()
             if clipboard_content is None:
                 messagebox.showwarning("警告", "剪切板中没有图片")
                 return
@@ -384,18 +656,17 @@ class ImageReplacerApp:
                 if not os.path.exists(file_path):
                     messagebox.showwarning("警告", f"剪切板中的文件路径不存在: {file_path}")
                     return
-                img = Image.open(file_path)
+                img = self._open_image_rgb(file_path)
             elif hasattr(clipboard_content, 'mode'):
                 # 如果是 Image 对象，直接使用
                 img = clipboard_content
+                # 确保是RGB模式
+                if img.mode != 'RGB':
+                    img = img.convert('RGB')
             else:
                 messagebox.showwarning("警告", "剪切板中的内容不是有效的图片")
                 return
             
-            # 确保是RGB模式
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            
             # 获取目标路径
             image_path = self.base_dir / self.current_item['image']
             image_path.parent.mkdir(parents=True, exist_ok=True)
@@ -406,11 +677,14 @@ class ImageReplacerApp:
                 size = min(width, height)
                 left = (width - size) // 2
                 top = (height - size) // 2
-                img = img.crop((left, top, left + size, top + size))
-                img = img.resize((1024, 1024), Image.Resampling.LANCZOS)
+                # 裁剪和缩放一步完成，不生成裁剪后的中间图片
+                img = img.resize((1024, 1024), Image.Resampling.LANCZOS, box=(left, top, left + size, top + size))
             
             # 保存图片
-            img.save(image_path, "JPEG", quality=70)
+            img.save(image_path, "JPEG", **self.JPEG_SAVE_OPTIONS)
+            # 立即释放像素缓冲区
+            img.close()
+            self._invalidate_preview(image_path)
             
             messagebox.showinfo("成功", f"图片已替换:\n{image_path}")
             self.update_image_preview()
@@ -440,9 +714,7 @@ class ImageReplacerApp:
         
         try:
             # 打开图片
-            img = Image.open(file_path)
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
+            img = self._open_image_rgb(file_path)
             
             # 获取目标路径
             image_path = self.base_dir / self.current_item['image']
@@ -454,44 +726,104 @@ class ImageReplacerApp:
                 size = min(width, height)
                 left = (width - size) // 2
                 top = (height - size) // 2
-                img = img.crop((left, top, left + size, top + size))
-                img = img.resize((1024, 1024), Image.Resampling.LANCZOS)
+                # 裁剪和缩放一步完成，不生成裁剪后的中间图片
+                img = img.resize((1024, 1024), Image.Resampling.LANCZOS, box=(left, top, left + size, top + size))
             
             # 保存图片
-            img.save(image_path, "JPEG", quality=95)
+            img.save(image_path, "JPEG", **self.JPEG_SAVE_OPTIONS)
+            # 立即释放像素缓冲区
+            img.close()
+            self._invalidate_preview(image_path)
             
             messagebox.showinfo("成功", f"图片已替换:\n{image_path}")
             self.update_image_preview()
         except Exception as e:
             messagebox.showerror("错误", f"替换图片失败:\n{e}")
     
-    def save_current_item(self, silent=False):
-        """保存当前项目的修改"""
+    def _sync_current_to_memory(self):
+        """把编辑框中的内容更新到当前项目（只修改内存中的数据）"""
         if not self.current_item or self.current_index is None:
             return
         
+        name = self.name_var.get()
+        name_english = self.name_english_var.get()
+        description = self.desc_text.get(1.0, tk.END).strip()
+        item = self.current_item
+        if (item.get('name') == name and item.get('name_english') == name_english
+                and item.get('description') == description):
+            return
+        
         # 更新当前项目数据
-        self.current_item['name'] = self.name_var.get()
-        self.current_item['name_english'] = self.name_english_var.get()
-        self.current_item['description'] = self.desc_text.get(1.0, tk.END).strip()
+        item['name'] = name
+        item['name_english'] = name_english
+        item['description'] = description
         
         # 更新列表中的数据
-        self.data[self.current_index] = self.current_item
+        self.data[self.current_index] = item
+        self._dirty = True
+    
+    def _flush_json_to_disk(self):
+        """把内存中的数据写入JSON文件"""
+        if self._autosave_job is not None:
+            self.root.after_cancel(self._autosave_job)
+            self._autosave_job = None
+        
+        # 先序列化为完整的字节串，再一次性写入
+        payload = _dumps(self.data)
+        payload_hash = hashlib.blake2b(payload).digest()
+        if payload_hash != self._last_saved_hash:
+            # 先写临时文件再替换，写入中断时不会留下损坏的JSON文件
+            tmp_path = self.json_file.with_name(self.json_file.name + ".tmp")
+            tmp_path.write_bytes(payload)
+            os.replace(tmp_path, self.json_file)
+            self._last_saved_hash = payload_hash
+        self._dirty = False
+    
+    def _schedule_autosave(self):
+        """安排延迟自动保存（连续修改时只在最后一次修改后保存一次）"""
+        if self._autosave_job is not None:
+            self.root.after_cancel(self._autosave_job)
+        self._autosave_job = self.root.after(self.AUTOSAVE_DELAY_MS, self._autosave)
+    
+    def _autosave(self):
+        """有未保存的修改时写入JSON文件"""
+        self._autosave_job = None
+        if not self._dirty:
+            return True
+        try:
+            self._flush_json_to_disk()
+            return True
+        except Exception as e:
+            print(f"警告：自动保存JSON文件失败: {e}")
+            return False
+    
+    def save_current_item(self):
+        """保存当前项目的修改"""
+        if not self.current_item or self.current_index is None:
+            return
+        
+        self._sync_current_to_memory()
         
         # 保存整个JSON文件
         try:
-            with open(self.json_file, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, ensure_ascii=False, indent=2)
-            if not silent:
-                messagebox.showinfo("成功", "当前项目已保存，JSON文件已更新")
+            self._flush_json_to_disk()
+            messagebox.showinfo("成功", "当前项目已保存，JSON文件已更新")
         except Exception as e:
-            if not silent:
-                messagebox.showerror("错误", f"保存JSON文件失败:\n{e}")
+            messagebox.showerror("错误", f"保存JSON文件失败:\n{e}")
+    
+    def on_close(self):
+        """关闭窗口"""
+        self._sync_current_to_memory()
+        if not self._autosave():
+            if not messagebox.askyesno("确认", "保存JSON文件失败，是否仍然退出？"):
+                return
+        self.root.destroy()
     
     def add_new_item(self):
         """添加新项目"""
-        # 先保存当前项目的修改
-        self.save_current_item(silent=True)
+        # 先把当前项目的修改保存到内存
+        self._flush_field_change()
+        self._sync_current_to_memory()
         
         # 计算新ID
         max_id = max((item.get('id', 0) for item in self.data), default=0)
@@ -512,6 +844,9 @@ class ImageReplacerApp:
         
         # 添加到数据列表
         self.data.append(new_item)
+        self._display_texts.append(self._format_display_text(new_item))
+        self._dirty = True
+        self._schedule_autosave()
         
         # 更新列表显示
         self.update_list()
@@ -565,8 +900,8 @@ class ImageReplacerApp:
             messagebox.showwarning("警告", "请先选择一个项目")
             return
         
-        # 先保存当前项目的修改
-        self.save_current_item(silent=True)
+        # 先把当前项目的修改保存到内存
+        self._sync_current_to_memory()
         
         # 检查必要字段
         name = self.name_var.get().strip()
@@ -620,11 +955,7 @@ class ImageReplacerApp:
         log_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         log_scrollbar.config(command=log_text.yview)
         
-        def log_message(message):
-            """添加日志消息"""
-            log_text.insert(tk.END, message + "\n")
-            log_text.see(tk.END)
-            progress_window.update()
+        log_message = self._create_log_writer(log_text)
         
         # 停止和关闭按钮
         button_frame = ttk.Frame(progress_frame)
@@ -705,26 +1036,55 @@ class ImageReplacerApp:
         thread = threading.Thread(target=run_generate, daemon=True)
         thread.start()
     
+    def _create_log_writer(self, log_text):
+        """创建线程安全的日志函数：消息先放入队列，界面线程每100毫秒批量写入日志区域"""
+        log_queue = queue.Queue()
+        
+        def drain():
+            lines = []
+            while True:
+                try:
+                    lines.append(log_queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not log_text.winfo_exists():
+                # 进度窗口已关闭
+                return
+            if lines:
+                log_text.insert(tk.END, "".join(lines))
+                log_text.see(tk.END)
+            self.root.after(100, drain)
+        
+        self.root.after(100, drain)
+        
+        def log_message(message):
+            """添加日志消息"""
+            log_queue.put(message + "\n")
+        
+        return log_message
+    
     def save_json(self):
         """保存JSON文件"""
-        # 先保存当前项目的修改
-        self.save_current_item(silent=True)
+        # 先把当前项目的修改保存到内存
+        self._sync_current_to_memory()
         
         if not self.data:
             messagebox.showwarning("警告", "没有数据可保存")
             return
         
         try:
-            with open(self.json_file, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, ensure_ascii=False, indent=2)
+            self._flush_json_to_disk()
             messagebox.showinfo("成功", f"JSON文件已保存:\n{self.json_file}")
         except Exception as e:
             messagebox.showerror("错误", f"保存JSON文件失败:\n{e}")
     
     def batch_generate_mp3(self):
         """批量生成MP3"""
-        # 先保存当前项目的修改
-        self.save_current_item(silent=True)
+        # 批量生成会从磁盘读取JSON文件，先把修改写入磁盘
+        self._sync_current_to_memory()
+        if not self._autosave():
+            messagebox.showerror("错误", "保存JSON文件失败，请先保存后再批量生成")
+            return
         
         if not self.data:
             messagebox.showwarning("警告", "没有数据可处理")
@@ -777,11 +1137,7 @@ class ImageReplacerApp:
         log_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         log_scrollbar.config(command=log_text.yview)
         
-        def log_message(message):
-            """添加日志消息"""
-            log_text.insert(tk.END, message + "\n")
-            log_text.see(tk.END)
-            progress_window.update()
+        log_message = self._create_log_writer(log_text)
         
         # 停止和关闭按钮
         button_frame = ttk.Frame(progress_frame)
@@ -795,62 +1151,82 @@ class ImageReplacerApp:
                                  command=progress_window.destroy, state=tk.DISABLED)
         close_button.pack(side=tk.LEFT, padx=5)
         
-        # 在后台线程中运行批量生成
-        import threading
-        
-        # 创建生成器实例（用于停止控制）
-        generator = None
+        # 在子进程中运行批量生成，界面进程只负责显示消息
+        config_path = self.base_dir / "tools" / "config.json"
+        ctx = multiprocessing.get_context("spawn")
+        message_queue = ctx.Queue()
+        stop_event = ctx.Event()
+        process = ctx.Process(
+            target=_batch_worker_entry,
+            args=(str(config_path), json_filename, message_queue, stop_event),
+            daemon=True
+        )
         
         def stop_generation():
             """停止生成"""
-            if generator:
-                generator.stop()
-                log_message("\n正在停止...")
-                status_label.config(text="正在停止...")
-                stop_button.config(state=tk.DISABLED)
+            stop_event.set()
+            log_message("\n正在停止...")
+            status_label.config(text="正在停止...")
+            stop_button.config(state=tk.DISABLED)
         
         stop_button.config(command=stop_generation)
         
-        def run_batch_generate():
-            nonlocal generator
-            try:
-                config_path = self.base_dir / "tools" / "config.json"
-                
-                # 创建生成器
-                generator = MP3BatchGenerator(str(config_path))
-                
-                log_message(f"开始批量生成 {len(self.data)} 个项目")
-                log_message("=" * 50)
-                
-                # 直接调用批量生成方法
-                result = generator.batch_generate(json_filename, 0, None)
-                
-                log_message("=" * 50)
-                if generator._check_stop():
-                    log_message("已停止")
-                    status_label.config(text="已停止")
-                elif result["failed"] == 0:
-                    log_message(f"批量生成完成！成功: {result['success']}")
-                    status_label.config(text="批量生成完成！")
-                else:
-                    log_message(f"批量生成完成！成功: {result['success']}, 失败: {result['failed']}")
-                    status_label.config(text=f"完成（成功: {result['success']}, 失败: {result['failed']}）")
-                
-            except Exception as e:
-                log_message(f"错误: {e}")
-                status_label.config(text=f"错误: {e}")
-                import traceback
-                log_message(traceback.format_exc())
-            finally:
-                # 启用关闭按钮，禁用停止按钮
-                close_button.config(state=tk.NORMAL)
-                stop_button.config(state=tk.DISABLED)
-                progress_var.set(f"完成 ({len(self.data)}/{len(self.data)})")
+        def finish(result=None, error=None):
+            """显示结果，启用关闭按钮，禁用停止按钮"""
+            log_message("=" * 50)
+            if error is not None:
+                log_message(f"错误: {error}")
+                status_label.config(text=f"错误: {error}")
+            elif stop_event.is_set():
+                log_message("已停止")
+                status_label.config(text="已停止")
+            elif result["failed"] == 0:
+                log_message(f"批量生成完成！成功: {result['success']}")
+                status_label.config(text="批量生成完成！")
+            else:
+                log_message(f"批量生成完成！成功: {result['success']}, 失败: {result['failed']}")
+                status_label.config(text=f"完成（成功: {result['success']}, 失败: {result['failed']}）")
+            close_button.config(state=tk.NORMAL)
+            stop_button.config(state=tk.DISABLED)
+            progress_var.set(f"完成 ({len(self.data)}/{len(self.data)})")
+        
+        def drain(timeout=None):
+            """取出队列中的所有消息，收到结果时返回 True"""
+            while True:
+                try:
+                    if timeout is None:
+                        kind, payload = message_queue.get_nowait()
+                    else:
+                        kind, payload = message_queue.get(timeout=timeout)
+                except queue.Empty:
+                    return False
+                if kind == "log":
+                    log_message(payload)
+                elif kind == "done":
+                    finish(result=payload)
+                    return True
+                elif kind == "error":
+                    finish(error=payload)
+                    return True
+        
+        def poll():
+            """每100毫秒取出子进程发来的消息"""
+            if drain():
+                return
+            if not process.is_alive():
+                # 子进程可能在上次取消息之后才发送结果并退出，等它结束后再取一次
+                process.join()
+                if drain(timeout=0.5):
+                    return
+                # 子进程没有发送结果就退出了（例如被强制结束）
+                finish(error=f"子进程异常退出（退出码 {process.exitcode}）")
+                return
+            self.root.after(100, poll)
         
-        # 启动后台线程
-        thread = threading.Thread(target=run_batch_generate, daemon=True)
-        thread.start()
-
+        log_message(f"开始批量生成 {len(self.data)} 个项目")
+        log_message("=" * 50)
+        process.start()
+        self.root.after(100, poll)
 
 def main():
     """主函数"""